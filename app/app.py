@@ -6,13 +6,36 @@ A lightweight, file-based prompt management system with search and Ollama integr
 
 import requests
 import os
+import sys
 import json
+import math
 import re
-from datetime import datetime
+import base64
+import copy
+import atexit
+import gc
+import time
+import hashlib
+import pickle
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, make_response, render_template, request, jsonify, redirect, url_for
 import yaml
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from renderer import compile_template, missing_variables, render_segments
+from search_index import FacetIndex, SearchIndex, make_snippet
+from watcher import PromptWatcher
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frontmatter_parser import atomic_write, load_frontmatter, write_prompt_file  # noqa: E402
+from ollama_client import (OllamaBusyError, PRIORITY_INTERACTIVE,  # noqa: E402
+                           ResponseCache, all_metrics, get_client)
+from prompt_loader import parse_prompt_file, parse_prompt_files  # noqa: E402
+from sidecar import MetadataSidecar  # noqa: E402
+from usage import (AsyncUsageWriter, SQLiteUsageStore, UsageCounterBuffer,  # noqa: E402
+                   UsageLog, UsageRollups)
 
 app = Flask(__name__)
 app.secret_key = 'cognitrix-dev-key-change-in-production'
@@ -20,92 +43,590 @@ app.secret_key = 'cognitrix-dev-key-change-in-production'
 # Configuration
 PROMPTS_DIR = Path('../prompts')
 CONFIG_DIR = Path('../config')
+CACHE_DIR = Path('../cache')
+SNAPSHOT_FILE = CACHE_DIR / 'prompt_index.pickle'
+RESPONSE_CACHE_DIR = CACHE_DIR / 'ollama_responses'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_RENDER_BATCH = 1000
+MAX_COMPARE_MODELS = 8
+DATA_DIR = Path('data')
+USAGE_LOG_DIR = DATA_DIR / 'usage'
+LEGACY_USAGE_LOG = DATA_DIR / 'usage_log.jsonl'
+USAGE_ROLLUPS_FILE = DATA_DIR / 'usage_rollups.json'
+USAGE_DB_FILE = DATA_DIR / 'usage.db'
+SIDECAR_FILE = DATA_DIR / 'prompt_state.jsonl'
+
+# Serializes read-modify-write cycles on prompt files
+prompt_write_lock = threading.Lock()
 
 
 class PromptManager:
-    def __init__(self, prompts_dir):
+    SNAPSHOT_VERSION = 3
+
+    def __init__(self, prompts_dir, snapshot_path=None, workers=1,
+                 executor='process', max_file_size=None, sidecar=None):
         self.prompts_dir = Path(prompts_dir)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.workers = workers
+        self.executor = executor
+        self.max_file_size = max_file_size
+        self.sidecar = sidecar
         self.prompts = []
         self.categories = defaultdict(list)
-        self.load_prompts()
+        self.search_index = SearchIndex()
+        self.facets = FacetIndex()
+        self._records = {}
+        self._manifest = {}  # file path -> (mtime_ns, size)
+        self._id_map = {}    # relative path, with or without .md -> file path
+        self._stem_ids = {}  # stem alias -> file path
+        self._stem_paths = defaultdict(set)
+        self._templates = {}  # file path -> compiled content segments
+        self._hashes = {}     # file path -> content hash
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # one load or reload at a time
+        self._snapshot_dirty = False
+
+        # Bumped on every index change; the random prefix keeps ETags from
+        # one process from matching another's
+        self.generation = 0
+        self.modified_at = math.ceil(time.time())
+        self._modified_served = False
+        self._etag_prefix = os.urandom(4).hex()
+
+        # Start from the snapshot when there is one; load_prompts then
+        # validates it against the manifest and re-parses stale files.
+        # Nothing else is running yet, so only this load may fork workers
+        self.load_snapshot()
+        self.load_prompts(executor=self.executor)
+        self.save_snapshot()
+
+    def load_snapshot(self):
+        """Restore the index from the on-disk snapshot if it is usable"""
+        if not self.snapshot_path or not self.snapshot_path.exists():
+            return False
+
+        # Unpickling creates millions of small objects; keep the cyclic
+        # GC from repeatedly scanning them while it runs
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('version') != self.SNAPSHOT_VERSION or \
+                    snapshot.get('prompts_dir') != str(self.prompts_dir.resolve()) or \
+                    snapshot.get('sidecar') != (self.sidecar is not None):
+                return False
+
+            with self._lock:
+                (self._records, self.categories, self.search_index,
+                 self.facets, self._manifest, self._id_map, self._stem_ids,
+                 self._stem_paths) = snapshot['state']
+                self._templates = {}
+                self._hashes = {}
+                self.prompts = list(self._records.values())
+                self._snapshot_dirty = False
+
+                # The sidecar may have been written after the snapshot
+                if self.sidecar is not None:
+                    for prompt_id, fields in self.sidecar.state.items():
+                        key = self._id_map.get(prompt_id)
+                        prompt_data = self._records.get(key)
+                        if prompt_data is not None and any(
+                                prompt_data.get(name) != value
+                                for name, value in fields.items()):
+                            self.update_prompt(key, fields)
+            return True
+        except Exception as e:
+            print(f"Ignoring unreadable index snapshot {self.snapshot_path}: {e}")
+            return False
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def save_snapshot(self, force=False):
+        """Write the index to the snapshot file if it changed since the last save"""
+        if not self.snapshot_path or not (self._snapshot_dirty or force):
+            return False
 
-    def load_prompts(self):
-        """Load all prompt files and build index"""
-        self.prompts = []
+        try:
+            with self._lock:
+                data = pickle.dumps({
+                    'version': self.SNAPSHOT_VERSION,
+                    'prompts_dir': str(self.prompts_dir.resolve()),
+                    'sidecar': self.sidecar is not None,
+                    'state': (self._records, self.categories,
+                              self.search_index, self.facets, self._manifest,
+                              self._id_map, self._stem_ids, self._stem_paths)
+                }, protocol=pickle.HIGHEST_PROTOCOL)
+                self._snapshot_dirty = False
+
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.snapshot_path, data)
+            return True
+        except Exception as e:
+            self._snapshot_dirty = True
+            print(f"Error saving index snapshot: {e}")
+            return False
+
+    def load_prompts(self, full=False, executor='thread'):
+        """Load added or changed prompt files and drop deleted ones.
+
+        Files are compared against the manifest recorded on the previous
+        load, so only files whose mtime or size changed are re-parsed.
+        Pass full=True to re-parse everything and rebuild the index.
+        """
+        current = self.scan_manifest()
+        if full:
+            return self.apply_changes(current, current, executor, reset=True)
+        return self.apply_changes(self.changed_paths(current), current,
+                                  executor)
+
+    def changed_paths(self, current):
+        """Return paths added, modified or deleted relative to the manifest"""
+        with self._lock:
+            removed = [key for key in self._manifest if key not in current]
+            changed = [key for key, signature in current.items()
+                       if self._manifest.get(key) != signature]
+        return removed + changed
+
+    def apply_changes(self, paths, current=None, executor='thread',
+                      reset=False):
+        """Re-parse or drop the given prompt files.
+
+        current is an optional {path: (mtime_ns, size)} map from
+        scan_manifest; paths missing from it are stat'ed directly. Files
+        are parsed without holding the index lock, so searches keep being
+        served from the current index until the results are merged. With
+        reset=True a new index is built from just the parsed files, also
+        outside the lock, and swapped in.
+
+        executor='process' forks worker processes, which can deadlock a
+        process that already runs other threads; only the initial load
+        uses it.
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0}
+        with self._load_lock:
+            signatures = {}
+            for key in sorted(str(path) for path in paths):
+                if current is not None:
+                    signatures[key] = current.get(key)
+                else:
+                    signatures[key] = self._stat_signature(key)
+
+            with self._lock:
+                manifest = {} if reset else dict(self._manifest)
+            to_parse = [
+                key for key, signature in signatures.items()
+                if signature is not None and manifest.get(key) != signature
+                and not (self.max_file_size and signature[1] > self.max_file_size)
+            ]
+            results = dict(zip(to_parse, parse_prompt_files(
+                to_parse, self.workers, executor)))
+
+            if not reset:
+                with self._lock:
+                    self._merge_changes(signatures, results, stats)
+                return stats
+
+            staging = copy.copy(self)
+            staging._reset_index()
+            staging._merge_changes(signatures, results, stats)
+            with self._lock:
+                (self._records, self.categories, self.search_index,
+                 self.facets, self._manifest, self._id_map, self._stem_ids,
+                 self._stem_paths, self._templates, self._hashes,
+                 self.prompts) = (
+                    staging._records, staging.categories,
+                    staging.search_index, staging.facets, staging._manifest,
+                    staging._id_map, staging._stem_ids, staging._stem_paths,
+                    staging._templates, staging._hashes, staging.prompts)
+                self._snapshot_dirty = True
+                self._bump_generation()
+        return stats
+
+    def _reset_index(self):
+        """Replace the index with empty structures (never mutating the old
+        ones, which a shallow copy may share)"""
         self.categories = defaultdict(list)
+        self.search_index = SearchIndex()
+        self.facets = FacetIndex()
+        self.prompts = []
+        self._records = {}
+        self._manifest = {}
+        self._id_map = {}
+        self._stem_ids = {}
+        self._stem_paths = defaultdict(set)
+        self._templates = {}
+        self._hashes = {}
+        self._snapshot_dirty = True
+        self._bump_generation()
+
+    def _merge_changes(self, signatures, results, stats):
+        """Apply parsed files and deletions to the index in path order"""
+        for key, signature in signatures.items():
+            if signature is None:
+                if key in self._manifest or key in self._records:
+                    self._remove_prompt(key)
+                    self._unregister_ids(key)
+                    self._manifest.pop(key, None)
+                    stats['removed'] += 1
+                continue
+
+            if self._manifest.get(key) == signature:
+                continue
+
+            if key not in self._manifest:
+                self._register_ids(key)
+
+            # Record the signature even on failure so a broken file is
+            # only retried once it changes again
+            self._manifest[key] = signature
+
+            if self.max_file_size and signature[1] > self.max_file_size:
+                print(f"Skipping {key}: larger than max_file_size")
+                if key in self._records:
+                    self._remove_prompt(key)
+                    stats['removed'] += 1
+                continue
+
+            # The app's own write (mark_written) can move the manifest
+            # while files are parsed; parse anything that was missed
+            prompt_data, error = results.get(key) or parse_prompt_files([key])[0]
+            existed = key in self._records
+            self._remove_prompt(key)
+            if error:
+                print(f"Error loading {key}: {error}")
+                continue
+            if prompt_data:
+                self._add_prompt(prompt_data)
+                stats['updated' if existed else 'added'] += 1
+
+        if any(stats.values()):
+            self.prompts = list(self._records.values())
+            self._snapshot_dirty = True
+            self._bump_generation()
+
+    def record_usage(self, file_path, last_used, count=1):
+        """Bump a prompt's in-memory use_count and last_used"""
+        with self._lock:
+            prompt_data = self._records.get(str(file_path))
+            if prompt_data is None:
+                return None
+            return self.update_prompt(file_path, {
+                'use_count': (prompt_data.get('use_count') or 0) + count,
+                'last_used': last_used
+            })
 
-        for prompt_file in self.prompts_dir.rglob('*.md'):
-            try:
-                prompt_data = self.parse_prompt_file(prompt_file)
-                if prompt_data:
-                    self.prompts.append(prompt_data)
-                    category = prompt_data.get('category', 'uncategorized')
-                    self.categories[category].append(prompt_data)
-            except Exception as e:
-                print(f"Error loading {prompt_file}: {e}")
+    def mark_written(self, file_path):
+        """Record the app's own write to a prompt file so the manifest does
+        not report it as changed and trigger a re-parse"""
+        key = str(file_path)
+        signature = self._stat_signature(key)
+        with self._lock:
+            if signature is not None and key in self._manifest:
+                self._manifest[key] = signature
+                self._snapshot_dirty = True
+
+    def relative_id(self, key):
+        """Return the prompt id of a file path relative to prompts_dir"""
+        try:
+            return Path(key).relative_to(self.prompts_dir).as_posix()
+        except ValueError:
+            return Path(key).name
+
+    def _register_ids(self, key):
+        """Map a file's relative path and stem to its file path"""
+        relative_id = self.relative_id(key)
+        self._id_map[relative_id] = key
+        self._id_map[relative_id[:-len('.md')]] = key
+
+        stem = Path(key).stem
+        self._stem_paths[stem].add(key)
+        self._refresh_stem(stem)
+
+    def _unregister_ids(self, key):
+        """Drop a file from the id maps, re-pointing a shared stem if needed"""
+        relative_id = self.relative_id(key)
+        for exact_id in (relative_id, relative_id[:-len('.md')]):
+            if self._id_map.get(exact_id) == key:
+                del self._id_map[exact_id]
+
+        stem = Path(key).stem
+        paths = self._stem_paths.get(stem)
+        if paths is not None:
+            paths.discard(key)
+            if not paths:
+                del self._stem_paths[stem]
+        self._refresh_stem(stem)
+
+    def _refresh_stem(self, stem):
+        """Point a stem alias at one of its files, chosen deterministically
+        since stems can collide across directories"""
+        paths = self._stem_paths.get(stem)
+        if paths:
+            self._stem_ids[stem] = min(paths)
+        else:
+            self._stem_ids.pop(stem, None)
 
-    def parse_prompt_file(self, file_path):
-        """Parse markdown file with YAML frontmatter"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def resolve_path(self, prompt_id):
+        """Resolve a prompt id to its file path.
 
-        # Split frontmatter and content
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
-                try:
-                    frontmatter = yaml.safe_load(parts[1])
-                    prompt_content = parts[2].strip()
+        Exact relative paths (with or without .md) win over stem aliases, so
+        prompts/foo.md stays 'foo' even when a/foo.md exists too.
+        """
+        if not prompt_id:
+            return None
+        normalized = prompt_id.replace('\\', '/').lstrip('/')
+        candidates = [normalized]
+        if normalized.startswith('prompts/'):
+            candidates.append(normalized[len('prompts/'):])
+        for id_map in (self._id_map, self._stem_ids):
+            for candidate in candidates:
+                key = id_map.get(candidate)
+                if key:
+                    return Path(key)
+        return None
 
-                    frontmatter['content'] = prompt_content
-                    frontmatter['file_path'] = str(file_path)
-                    frontmatter['id'] = str(file_path.stem)
+    def get_prompt(self, prompt_id):
+        """Return the indexed prompt record for an id, or None"""
+        path = self.resolve_path(prompt_id)
+        if path is None:
+            return None
+        return self._records.get(str(path))
 
-                    return frontmatter
-                except yaml.YAMLError as e:
-                    print(f"YAML error in {file_path}: {e}")
+    def _stat_signature(self, path):
+        """Return (mtime_ns, size) for a prompt file, or None if it is gone"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def scan_manifest(self):
+        """Stat every prompt file, returning {path: (mtime_ns, size)}"""
+        manifest = {}
+        pending = [str(self.prompts_dir)]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.endswith('.md'):
+                            stat = entry.stat()
+                            manifest[entry.path] = (stat.st_mtime_ns,
+                                                    stat.st_size)
+                    except OSError:
+                        continue
+        return manifest
+
+    def _add_prompt(self, prompt_data):
+        """Add a parsed prompt to the records, categories and search index"""
+        key = prompt_data['file_path']
+        if self.sidecar is not None:
+            # Mutable fields in the sidecar override the frontmatter
+            prompt_data.update(self.sidecar.get(self.relative_id(key)) or {})
+        self._records[key] = prompt_data
+        category = prompt_data.get('category', 'uncategorized')
+        self.categories[category].append(prompt_data)
+        self.search_index.add(key, self._search_fields(prompt_data))
+        self.facets.add(key, category, self._prompt_tags(prompt_data),
+                        prompt_data.get('favorite', False))
+
+    def _search_fields(self, prompt_data):
+        """Return the text fields of a prompt that the search index covers"""
+        return {
+            'title': prompt_data.get('title', ''),
+            'tags': self._prompt_tags(prompt_data),
+            'category': prompt_data.get('category', ''),
+            'content': prompt_data.get('content', '')
+        }
 
-        return None
+    def update_prompt(self, file_path, fields):
+        """Apply field changes to one indexed prompt in place.
+
+        Category buckets, facets and search postings are adjusted for just
+        this record, so a mutation costs O(1) instead of a reload. Returns
+        the updated record, or None if the prompt is not indexed.
+        """
+        key = str(file_path)
+        with self._lock:
+            prompt_data = self._records.get(key)
+            if prompt_data is None:
+                return None
+
+            if 'content' in fields:
+                self._templates.pop(key, None)
+            self._hashes.pop(key, None)
+            old_category = prompt_data.get('category', 'uncategorized')
+            reindex = any(name in fields and fields[name] != prompt_data.get(name)
+                          for name in SearchIndex.FIELDS)
+            prompt_data.update(fields)
+
+            category = prompt_data.get('category', 'uncategorized')
+            if category != old_category:
+                self._remove_from_category(old_category, prompt_data)
+                self.categories[category].append(prompt_data)
+            if reindex:
+                self.search_index.add(key, self._search_fields(prompt_data))
+            self.facets.add(key, category, self._prompt_tags(prompt_data),
+                            prompt_data.get('favorite', False))
+            self._snapshot_dirty = True
+            self._bump_generation()
+            return prompt_data
+
+    def update_state(self, file_path, fields):
+        """Update mutable fields in memory and record them in the sidecar"""
+        prompt_data = self.update_prompt(file_path, fields)
+        if prompt_data is not None and self.sidecar is not None:
+            self.sidecar.update(self.relative_id(str(file_path)), fields)
+        return prompt_data
+
+    def get_record(self, file_path):
+        """Return the indexed prompt record for a file path, or None"""
+        return self._records.get(str(file_path))
+
+    def _bump_generation(self):
+        # Whole seconds, rounded up, and always past any Last-Modified
+        # already sent; otherwise a change in the same second as a fetch
+        # would be answered with a stale 304
+        self.generation += 1
+        modified_at = math.ceil(time.time())
+        if self._modified_served and modified_at <= self.modified_at:
+            modified_at = self.modified_at + 1
+        self.modified_at = modified_at
+        self._modified_served = False
+
+    def last_modified(self):
+        """Return the index's modification time for Last-Modified headers"""
+        with self._lock:
+            self._modified_served = True
+            return self.modified_at
+
+    def index_etag(self):
+        """Return an ETag that changes whenever the index does"""
+        return f"{self._etag_prefix}-{self.generation}"
+
+    def content_hash(self, file_path):
+        """Return a hash of an indexed prompt's fields, or None"""
+        key = str(file_path)
+        digest = self._hashes.get(key)
+        if digest is None:
+            prompt_data = self._records.get(key)
+            if prompt_data is None:
+                return None
+            digest = hashlib.blake2b(
+                json.dumps(prompt_data, sort_keys=True, default=str).encode('utf-8'),
+                digest_size=12).hexdigest()
+            with self._lock:
+                if self._records.get(key) is prompt_data:
+                    self._hashes[key] = digest
+        return digest
+
+    def get_template(self, file_path):
+        """Return the compiled content of an indexed prompt, or None.
+
+        Templates are compiled on first use and cached until the prompt
+        changes; they live here rather than on the record so records stay
+        JSON-serializable.
+        """
+        key = str(file_path)
+        segments = self._templates.get(key)
+        if segments is None:
+            prompt_data = self._records.get(key)
+            if prompt_data is None:
+                return None
+            segments = compile_template(prompt_data.get('content', ''))
+            with self._lock:
+                if self._records.get(key) is prompt_data:
+                    self._templates[key] = segments
+        return segments
+
+    @staticmethod
+    def _prompt_tags(prompt_data):
+        """Return a prompt's tags as a list, tolerating malformed values"""
+        tags = prompt_data.get('tags') or []
+        if isinstance(tags, str):
+            return [tags]
+        return [str(tag) for tag in tags]
+
+    def _remove_prompt(self, key):
+        """Remove a prompt from the records, categories and search index"""
+        prompt_data = self._records.pop(key, None)
+        self._templates.pop(key, None)
+        self._hashes.pop(key, None)
+        if prompt_data is None:
+            return
+
+        self._remove_from_category(
+            prompt_data.get('category', 'uncategorized'), prompt_data)
+        self.search_index.remove(key)
+        self.facets.remove(key)
+
+    def _remove_from_category(self, category, prompt_data):
+        """Take a record out of its category bucket"""
+        # Replace rather than mutate the bucket so readers iterating it
+        # from another thread never see it change underneath them
+        bucket = [p for p in self.categories.get(category, [])
+                  if p is not prompt_data]
+        if bucket:
+            self.categories[category] = bucket
+        else:
+            self.categories.pop(category, None)
+
+    def parse_prompt_file(self, file_path):
+        """Parse markdown file with YAML frontmatter"""
+        return parse_prompt_file(file_path)
 
     def search_prompts(self, query):
-        """Search prompts by title, content, and tags"""
+        """Search prompts by title, content, tags and category using BM25"""
         if not query:
             return self.prompts
 
-        query_lower = query.lower()
         results = []
+        with self._lock:
+            for key, score in self.search_index.search(query):
+                prompt = self._records.get(key)
+                if prompt:
+                    results.append(dict(prompt, search_score=round(score, 2)))
+        return results
 
-        for prompt in self.prompts:
-            score = 0
-
-            # Title match (highest weight)
-            if query_lower in prompt.get('title', '').lower():
-                score += 10
-
-            # Tag match
-            tags = prompt.get('tags', [])
-            if any(query_lower in tag.lower() for tag in tags):
-                score += 5
-
-            # Content match
-            if query_lower in prompt.get('content', '').lower():
-                score += 2
-
-            # Category match
-            if query_lower in prompt.get('category', '').lower():
-                score += 3
+    def filter_prompts(self, query='', category='', tags=None,
+                       favorites_only=False):
+        """Search and filter prompts, returning [(prompt, score)].
+
+        Facet filters are intersections of precomputed id sets; the query
+        is ranked by the search index and restricted to those ids.
+        """
+        with self._lock:
+            allowed = self.facets.filter(category, tags, favorites_only)
+            if query:
+                ranked = [(key, score)
+                          for key, score in self.search_index.search(query)
+                          if allowed is None or key in allowed]
+            elif allowed is None:
+                ranked = [(key, 0.0) for key in self._records]
+            else:
+                ranked = [(key, 0.0) for key in sorted(allowed)]
 
-            if score > 0:
-                prompt['search_score'] = score
-                results.append(prompt)
+            return [(self._records[key], score) for key, score in ranked
+                    if key in self._records]
 
-        # Sort by score (descending)
-        results.sort(key=lambda x: x['search_score'], reverse=True)
-        return results
+    def category_counts(self):
+        """Return {category: prompt count} from the maintained counters"""
+        with self._lock:
+            return dict(self.facets.category_counts)
 
     def get_favorites(self):
         """Get favorite prompts"""
-        return [p for p in self.prompts if p.get('favorite', False)]
+        with self._lock:
+            return [self._records[key] for key in sorted(self.facets.favorites)
+                    if key in self._records]
 
     def get_recent(self, limit=10):
         """Get recently used prompts"""
@@ -114,18 +635,90 @@ class PromptManager:
         return recent[:limit]
 
 
-# Initialize prompt manager
-prompt_manager = PromptManager(PROMPTS_DIR)
+def find_prompt_file(prompt_id):
+    """Centralized prompt file finder backed by the manager's id map"""
+    prompt_file = prompt_manager.resolve_path(prompt_id)
+    if prompt_file is None or not prompt_file.exists():
+        return None
+    return prompt_file
 
 
-def find_prompt_file(prompt_id):
-    """Centralized prompt file finder"""
-    for prompt_file in PROMPTS_DIR.rglob('*.md'):
-        relative_path = str(prompt_file.relative_to(
-            PROMPTS_DIR)).replace('\\', '/')
-        if relative_path == prompt_id or prompt_file.stem == prompt_id:
-            return prompt_file
-    return None
+def encode_cursor(offset):
+    """Encode a result offset as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor back into an offset"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded.encode()).decode())
+
+
+def paginate_results(results, query='', build=dict):
+    """Slice, project and annotate search results for JSON responses.
+
+    Honors limit, offset (or cursor) and fields= from the query string.
+    build turns a result into a response dict and, like the snippets with
+    highlight offsets, only runs for the returned page.
+    """
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    try:
+        offset = decode_cursor(cursor) if cursor else \
+            request.args.get('offset', 0, type=int)
+    except ValueError:
+        offset = 0
+    offset = max(offset, 0)
+
+    fields = [field.strip() for field in request.args.get('fields', '').split(',')
+              if field.strip()]
+
+    page = []
+    for result in results[offset:offset + limit]:
+        item = build(result)
+        if query and (not fields or 'snippet' in fields):
+            item['snippet'] = make_snippet(item.get('content', ''), query)
+        if fields:
+            item = {field: item[field] for field in fields if field in item}
+        page.append(item)
+
+    next_offset = offset + limit if offset + limit < len(results) else None
+    return page, {
+        'total': len(results),
+        'limit': limit,
+        'offset': offset,
+        'next_offset': next_offset,
+        'next_cursor': encode_cursor(next_offset) if next_offset is not None else None
+    }
+
+
+def conditional_response(etag, last_modified, build):
+    """Answer 304 if the client already has this version, otherwise build
+    the response and tag it with etag and last_modified (whole epoch
+    seconds)"""
+    last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = request.if_modified_since is not None and \
+            last_modified <= request.if_modified_since
+    if fresh:
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # Always revalidate
+    return response
+
+
+def page_etag():
+    """ETag for HTML pages, which show the whole index in the sidebar"""
+    ollama_enabled = get_config().get('features', {}).get('ollama_testing', False)
+    return f"{prompt_manager.index_etag()}-{int(bool(ollama_enabled))}"
 
 
 def get_template_context():
@@ -142,6 +735,11 @@ def get_template_context():
 @app.route('/')
 def index():
     """Main dashboard"""
+    return conditional_response(page_etag(), prompt_manager.last_modified(),
+                                render_index)
+
+
+def render_index():
     stats = {
         'total_prompts': len(prompt_manager.prompts),
         'categories': len(prompt_manager.categories),
@@ -165,7 +763,8 @@ def search():
     results = prompt_manager.search_prompts(query)
 
     if request.headers.get('Content-Type') == 'application/json':
-        return jsonify({'results': results, 'query': query})
+        page, pagination = paginate_results(results, query)
+        return jsonify({'results': page, 'query': query, **pagination})
 
     context = get_template_context()
     context.update({
@@ -179,38 +778,44 @@ def search():
 @app.route('/prompt/<prompt_id>')
 def view_prompt(prompt_id):
     """View individual prompt"""
-    prompt = next(
-        (p for p in prompt_manager.prompts if p['id'] == prompt_id), None)
+    prompt = prompt_manager.get_prompt(prompt_id)
     if not prompt:
         return "Prompt not found", 404
 
-    context = get_template_context()
-    context.update({
-        'prompt': prompt
-    })
+    def build():
+        context = get_template_context()
+        context.update({
+            'prompt': prompt
+        })
+        return render_template('prompt.html', **context)
 
-    return render_template('prompt.html', **context)
+    return conditional_response(page_etag(), prompt_manager.last_modified(), build)
 
 
 @app.route('/category/<category_name>')
 def view_category(category_name):
     """View prompts by category"""
-    prompts = prompt_manager.categories.get(category_name, [])
+    def build():
+        prompts = prompt_manager.categories.get(category_name, [])
 
-    context = get_template_context()
-    context.update({
-        'prompts': prompts,
-        'category': category_name  # Ensure this is a string
-    })
+        context = get_template_context()
+        context.update({
+            'prompts': prompts,
+            'category': category_name  # Ensure this is a string
+        })
+        return render_template('category.html', **context)
 
-    return render_template('category.html', **context)
+    return conditional_response(page_etag(), prompt_manager.last_modified(), build)
 
 
 @app.route('/api/reload')
 def reload_prompts():
-    """Reload prompts from disk"""
-    prompt_manager.load_prompts()
-    return jsonify({'status': 'success', 'message': 'Prompts reloaded'})
+    """Reload prompts from disk (only changed files unless ?full=true)"""
+    full = request.args.get('full', '').lower() == 'true'
+    changes = prompt_manager.load_prompts(full=full)
+    prompt_manager.save_snapshot()
+    return jsonify({'status': 'success', 'message': 'Prompts reloaded',
+                    'changes': changes})
 
 
 @app.errorhandler(404)
@@ -250,11 +855,7 @@ def track_usage():
         }
 
         # Save to usage log file
-        usage_log_path = os.path.join('data', 'usage_log.jsonl')
-        os.makedirs('data', exist_ok=True)
-
-        with open(usage_log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(usage_entry) + '\n')
+        usage_writer.append(usage_entry)
 
         return jsonify({'status': 'success'})
 
@@ -262,6 +863,57 @@ def track_usage():
         print(f"Usage tracking error: {e}")
         return jsonify({'error': 'Failed to track usage'}), 500
 
+
+def load_prompt(prompt_file):
+    """Return (metadata, content, segments) for a prompt file.
+
+    Indexed prompts come straight from memory with their cached compiled
+    template; anything else (such as a file without frontmatter) is read
+    and compiled on the spot.
+    """
+    prompt_data = prompt_manager.get_record(prompt_file)
+    segments = prompt_manager.get_template(prompt_file)
+    if prompt_data is not None and segments is not None:
+        metadata = {key: value for key, value in prompt_data.items()
+                    if key not in ('content', 'file_path', 'id')}
+        return metadata, prompt_data.get('content', ''), segments
+
+    with open(prompt_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    metadata = {}
+    prompt_content = content
+    if content.startswith('---'):
+        parts = content.split('---', 2)
+        if len(parts) >= 3:
+            try:
+                metadata = load_frontmatter(parts[1]) or {}
+                prompt_content = parts[2].strip()
+            except yaml.YAMLError:
+                pass
+    return metadata, prompt_content, compile_template(prompt_content)
+
+
+def render_prompt(prompt_file, variables, strict=False):
+    """Substitute variables into a prompt.
+
+    Returns (metadata, content, rendered, missing); rendered is None when
+    strict is set and placeholders are left without a value.
+    """
+    metadata, content, segments = load_prompt(prompt_file)
+    missing = missing_variables(segments, variables)
+    if strict and missing:
+        return metadata, content, None, missing
+    return metadata, content, render_segments(segments, variables), missing
+
+
+def is_truthy(value):
+    """Interpret a query-string or JSON flag"""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
 # Route to get prompt content with variable processing
 
 
@@ -270,42 +922,11 @@ def get_prompt_content(prompt_id):
     """Get prompt content for copying with optional variable substitution"""
     try:
         # Find the prompt file
-        prompt_file = None
-        for root, dirs, files in os.walk(PROMPTS_DIR):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
-                    if file_path.replace('\\', '/').replace('prompts/', '') == prompt_id:
-                        prompt_file = file_path
-                        break
-            if prompt_file:
-                break
+        prompt_file = find_prompt_file(prompt_id)
 
         if not prompt_file:
             return jsonify({'error': 'Prompt not found'}), 404
 
-        # Read and parse the prompt
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Parse YAML frontmatter
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
-                import yaml
-                try:
-                    metadata = yaml.safe_load(parts[1])
-                    prompt_content = parts[2].strip()
-                except yaml.YAMLError:
-                    metadata = {}
-                    prompt_content = content
-            else:
-                metadata = {}
-                prompt_content = content
-        else:
-            metadata = {}
-            prompt_content = content
-
         # Get variables from query parameters for substitution
         variables = {}
         for key, value in request.args.items():
@@ -313,20 +934,27 @@ def get_prompt_content(prompt_id):
                 var_name = key[4:]  # Remove 'var_' prefix
                 variables[var_name] = value
 
-        # Substitute variables if provided
-        processed_content = prompt_content
-        if variables:
-            for var_name, var_value in variables.items():
-                placeholder = f'{{{var_name}}}'
-                processed_content = processed_content.replace(
-                    placeholder, var_value)
+        def build():
+            metadata, prompt_content, processed_content, missing = render_prompt(
+                prompt_file, variables, is_truthy(request.args.get('strict')))
+            if processed_content is None:
+                return jsonify({'error': 'Missing variables', 'missing_variables': missing}), 400
 
-        return jsonify({
-            'content': processed_content,
-            'original_content': prompt_content,
-            'metadata': metadata,
-            'variables_used': variables
-        })
+            return jsonify({
+                'content': processed_content,
+                'original_content': prompt_content,
+                'metadata': metadata,
+                'variables_used': variables,
+                'missing_variables': missing
+            })
+
+        # Only prompts in the index have a content hash to key the ETag on
+        content_hash = prompt_manager.content_hash(prompt_file)
+        if content_hash is None:
+            return build()
+        query_hash = hashlib.blake2b(request.query_string, digest_size=6).hexdigest()
+        return conditional_response(f"{content_hash}-{query_hash}",
+                                    prompt_manager.last_modified(), build)
 
     except Exception as e:
         print(f"Error getting prompt content: {e}")
@@ -339,59 +967,13 @@ def get_prompt_content(prompt_id):
 def get_usage_stats():
     """Get usage statistics for dashboard"""
     try:
-        usage_log_path = os.path.join('data', 'usage_log.jsonl')
-
-        if not os.path.exists(usage_log_path):
-            return jsonify({
-                'total_copies': 0,
-                'today_copies': 0,
-                'most_used_prompts': [],
-                'recent_activity': []
-            })
-
-        usage_data = []
-        today = datetime.now().date()
+        usage_writer.flush()
+        if usage_rollups is None:
+            return jsonify(usage_store.stats())
 
-        with open(usage_log_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                    usage_data.append(entry)
-                except json.JSONDecodeError:
-                    continue
-
-        # Calculate statistics
-        total_copies = len(
-            [entry for entry in usage_data if entry.get('action') == 'copy'])
-
-        today_copies = len([
-            entry for entry in usage_data
-            if entry.get('action') == 'copy' and
-            datetime.fromisoformat(entry.get('timestamp', '')).date() == today
-        ])
-
-        # Most used prompts (last 30 days)
-        from collections import Counter
-        recent_copies = [
-            entry['prompt_id'] for entry in usage_data
-            if entry.get('action') == 'copy' and
-            (datetime.now() - datetime.fromisoformat(entry.get('timestamp', ''))).days <= 30
-        ]
-        most_used = Counter(recent_copies).most_common(5)
-
-        # Recent activity (last 10 actions)
-        recent_activity = sorted(
-            usage_data,
-            key=lambda x: x.get('timestamp', ''),
-            reverse=True
-        )[:10]
-
-        return jsonify({
-            'total_copies': total_copies,
-            'today_copies': today_copies,
-            'most_used_prompts': [{'prompt_id': pid, 'count': count} for pid, count in most_used],
-            'recent_activity': recent_activity
-        })
+        # Only lines appended since the last call are read
+        usage_rollups.refresh(usage_store.segments())
+        return jsonify(usage_rollups.stats())
 
     except Exception as e:
         print(f"Error getting usage stats: {e}")
@@ -400,35 +982,50 @@ def get_usage_stats():
 # Helper function to update prompt metadata (last_used, use_count)
 
 
-def update_prompt_usage(prompt_file_path):
-    """Update prompt file with usage statistics"""
-    try:
-        with open(prompt_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+def update_prompt_usage(prompt_file_path, count=1, last_used=None):
+    """Update prompt file with usage statistics.
 
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
-                import yaml
-                try:
-                    metadata = yaml.safe_load(parts[1]) or {}
-                    prompt_content = parts[2].strip()
+    Errors are raised rather than printed so the usage buffer keeps the
+    counts and retries them on its next flush.
+    """
+    prompt_data = prompt_manager.get_record(prompt_file_path)
+    if prompt_data is None and not os.path.exists(prompt_file_path):
+        return  # Prompt was deleted; nothing left to update
 
-                    # Update usage metadata
-                    metadata['last_used'] = datetime.now().strftime('%Y-%m-%d')
-                    metadata['use_count'] = metadata.get('use_count', 0) + 1
+    if prompt_manager.sidecar is not None and prompt_data is not None:
+        # record_usage already counted these uses in memory
+        prompt_manager.update_state(prompt_file_path, {
+            'use_count': prompt_data.get('use_count') or 0,
+            'last_used': last_used or prompt_data.get('last_used')
+        })
+        return
 
-                    # Write back to file
-                    new_content = f"---\n{yaml.dump(metadata, default_flow_style=False)}---\n{prompt_content}"
+    with prompt_write_lock:
+        _write_prompt_usage(prompt_file_path, count, last_used)
 
-                    with open(prompt_file_path, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
 
-                except yaml.YAMLError:
-                    pass  # Skip if YAML is malformed
+def _write_prompt_usage(prompt_file_path, count, last_used):
+    """Add count uses to a prompt file's frontmatter"""
+    with open(prompt_file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
 
-    except Exception as e:
-        print(f"Error updating prompt usage: {e}")
+    if content.startswith('---'):
+        parts = content.split('---', 2)
+        if len(parts) >= 3:
+            try:
+                metadata = load_frontmatter(parts[1]) or {}
+                prompt_content = parts[2].strip()
+
+                # Update usage metadata
+                metadata['last_used'] = last_used or datetime.now().strftime('%Y-%m-%d')
+                metadata['use_count'] = (metadata.get('use_count') or 0) + count
+
+                # Write back to file
+                write_prompt_file(prompt_file_path, metadata, prompt_content)
+                prompt_manager.mark_written(prompt_file_path)
+
+            except yaml.YAMLError:
+                pass  # Skip if YAML is malformed
 
 # Enhanced route with usage tracking
 
@@ -445,44 +1042,21 @@ def copy_prompt():
             return jsonify({'error': 'Missing prompt_id'}), 400
 
         # Find and process the prompt
-        prompt_file = None
-        for root, dirs, files in os.walk(PROMPTS_DIR):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
-                    if file_path.replace('\\', '/').replace('prompts/', '') == prompt_id:
-                        prompt_file = file_path
-                        break
-            if prompt_file:
-                break
+        prompt_file = find_prompt_file(prompt_id)
 
         if not prompt_file:
             return jsonify({'error': 'Prompt not found'}), 404
 
-        # Read prompt content
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Parse content
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
-                prompt_content = parts[2].strip()
-            else:
-                prompt_content = content
-        else:
-            prompt_content = content
-
         # Process variables
-        processed_content = prompt_content
-        if variables:
-            for var_name, var_value in variables.items():
-                placeholder = f'{{{var_name}}}'
-                processed_content = processed_content.replace(
-                    placeholder, var_value)
+        _, _, processed_content, missing = render_prompt(
+            prompt_file, variables, is_truthy(data.get('strict')))
+        if processed_content is None:
+            return jsonify({'error': 'Missing variables', 'missing_variables': missing}), 400
 
-        # Update usage metadata
-        update_prompt_usage(prompt_file)
+        # Update usage metadata in memory; the file is written behind
+        today = datetime.now().strftime('%Y-%m-%d')
+        prompt_manager.record_usage(prompt_file, today)
+        usage_buffer.record(prompt_file, today)
 
         # Track usage
         usage_entry = {
@@ -494,16 +1068,13 @@ def copy_prompt():
             'ip_address': request.remote_addr
         }
 
-        usage_log_path = os.path.join('data', 'usage_log.jsonl')
-        os.makedirs('data', exist_ok=True)
-
-        with open(usage_log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(usage_entry) + '\n')
+        usage_writer.append(usage_entry)
 
         return jsonify({
             'content': processed_content,
             'status': 'success',
-            'variables_processed': len(variables)
+            'variables_processed': len(variables),
+            'missing_variables': missing
         })
 
     except Exception as e:
@@ -511,6 +1082,79 @@ def copy_prompt():
         return jsonify({'error': 'Failed to process prompt'}), 500
 
 
+@app.route('/api/render-batch', methods=['POST'])
+def render_batch():
+    """Render many prompts and variable sets, streamed as JSON lines"""
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Missing items'}), 400
+    if len(items) > MAX_RENDER_BATCH:
+        return jsonify({'error': f'At most {MAX_RENDER_BATCH} items per batch'}), 400
+
+    options = data if isinstance(data, dict) else {}
+    strict = is_truthy(options.get('strict', False))
+    track = is_truthy(options.get('track_usage', True))
+    user_agent = request.headers.get('User-Agent', '')
+    ip_address = request.remote_addr
+
+    def generate():
+        uses = defaultdict(int)
+        entries = []
+        try:
+            for index, item in enumerate(items):
+                # Items are {"prompt_id", "variables"} or [prompt_id, variables]
+                if isinstance(item, dict):
+                    prompt_id = item.get('prompt_id')
+                    variables = item.get('variables') or {}
+                elif isinstance(item, list) and len(item) == 2:
+                    prompt_id, variables = item
+                else:
+                    prompt_id, variables = None, {}
+                result = {'index': index, 'prompt_id': prompt_id}
+
+                prompt_file = find_prompt_file(prompt_id) if isinstance(prompt_id, str) else None
+                if not prompt_file:
+                    result['error'] = 'Prompt not found'
+                elif not isinstance(variables, dict):
+                    result['error'] = 'variables must be an object'
+                else:
+                    try:
+                        _, _, content, missing = render_prompt(
+                            prompt_file, variables, strict)
+                    except Exception as e:
+                        print(f"Error rendering {prompt_id}: {e}")
+                        content, missing = None, []
+                        result['error'] = 'Failed to process prompt'
+                    if missing:
+                        result['missing_variables'] = missing
+                    if content is not None:
+                        result['content'] = content
+                        uses[prompt_file] += 1
+                        entries.append({
+                            'prompt_id': prompt_id,
+                            'action': 'render',
+                            'timestamp': datetime.now().isoformat(),
+                            'variables_used': variables,
+                            'user_agent': user_agent,
+                            'ip_address': ip_address
+                        })
+                    elif 'error' not in result:
+                        result['error'] = 'Missing variables'
+
+                yield json.dumps(result) + '\n'
+        finally:
+            # Account for everything rendered, even if the client went away
+            if track and uses:
+                today = datetime.now().strftime('%Y-%m-%d')
+                for prompt_file, count in uses.items():
+                    prompt_manager.record_usage(prompt_file, today, count)
+                    usage_buffer.record(prompt_file, today, count)
+                usage_writer.extend(entries)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
 @app.route('/api/toggle-favorite', methods=['POST'])
 def toggle_favorite():
     """Toggle favorite status of a prompt - FIXED VERSION"""
@@ -530,80 +1174,279 @@ def toggle_favorite():
             # Debug logging
             print(f"Prompt file not found for ID: {prompt_id}")
             # List available files for debugging
-            available_files = list(PROMPTS_DIR.rglob('*.md'))
-            print(
-                f"Available files: {[str(f.relative_to(PROMPTS_DIR)) for f in available_files[:5]]}")
+            available_files = [p['id'] for p in prompt_manager.prompts[:5]]
+            print(f"Available files: {available_files}")
             return jsonify({'error': 'Prompt not found'}), 404
 
         print(f"Found prompt file: {prompt_file}")  # Debug logging
 
-        # Read and update the prompt file
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+        today = datetime.now().strftime('%Y-%m-%d')
+        prompt_data = prompt_manager.get_record(prompt_file)
+        if prompt_manager.sidecar is not None and prompt_data is not None:
+            # The prompt file is left untouched; the sidecar holds the flag
+            with prompt_write_lock:
+                is_favorite = not prompt_data.get('favorite', False)
+                prompt_manager.update_state(prompt_file, {
+                    'favorite': is_favorite,
+                    'last_modified': today
+                })
+            return jsonify({'status': 'success', 'is_favorite': is_favorite})
+
+        # Read and update the prompt file; the lock keeps concurrent
+        # clicks from toggling the same file off stale reads
+        with prompt_write_lock:
+            with open(prompt_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            if content.startswith('---'):
+                parts = content.split('---', 2)
+                if len(parts) < 3:
+                    return jsonify({'error': 'Invalid file format'}), 400
 
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
                 try:
-                    metadata = yaml.safe_load(parts[1]) or {}
-                    prompt_content = parts[2].strip()
+                    metadata = load_frontmatter(parts[1]) or {}
+                except yaml.YAMLError as e:
+                    print(f"YAML parsing error: {e}")  # Debug logging
+                    return jsonify({'error': f'YAML parsing error: {str(e)}'}), 500
+                prompt_content = parts[2].strip()
 
-                    # Toggle favorite status
-                    current_favorite = metadata.get('favorite', False)
-                    metadata['favorite'] = not current_favorite
+                # Toggle favorite status and update last_modified
+                metadata['favorite'] = not metadata.get('favorite', False)
+                metadata['last_modified'] = today
+                write_prompt_file(prompt_file, metadata, prompt_content)
 
-                    # Update last_modified
-                    metadata['last_modified'] = datetime.now().strftime(
-                        '%Y-%m-%d')
+                # Debug logging
+                print(f"Updated favorite status to: {metadata['favorite']}")
+            else:
+                # Add frontmatter to file without it
+                metadata = {
+                    'favorite': True,
+                    'last_modified': today
+                }
+                write_prompt_file(prompt_file, metadata, content)
+
+            # Update just this record in the in-memory index
+            updated = prompt_manager.update_prompt(prompt_file, {
+                'favorite': metadata['favorite'],
+                'last_modified': today
+            })
+            if updated is not None:
+                prompt_manager.mark_written(prompt_file)
+            else:
+                prompt_manager.apply_changes([prompt_file])
 
-                    # Write back to file
-                    new_content = f"---\n{yaml.dump(metadata, default_flow_style=False)}---\n{prompt_content}"
+        return jsonify({
+            'status': 'success',
+            'is_favorite': metadata['favorite']
+        })
 
-                    with open(prompt_file, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
+    except Exception as e:
+        print(f"Error toggling favorite: {e}")  # Debug logging
+        import traceback
+        traceback.print_exc()  # Print full traceback for debugging
+        return jsonify({'error': 'Failed to toggle favorite'}), 500
 
-                    # Debug logging
-                    print(
-                        f"Updated favorite status to: {metadata['favorite']}")
 
-                    # Reload prompts to update the in-memory index
-                    prompt_manager.load_prompts()
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-                    return jsonify({
-                        'status': 'success',
-                        'is_favorite': metadata['favorite']
-                    })
 
-                except yaml.YAMLError as e:
-                    print(f"YAML parsing error: {e}")  # Debug logging
-                    return jsonify({'error': f'YAML parsing error: {str(e)}'}), 500
-            else:
-                return jsonify({'error': 'Invalid file format'}), 400
-        else:
-            # Add frontmatter to file without it
-            metadata = {
-                'favorite': True,
-                'last_modified': datetime.now().strftime('%Y-%m-%d')
-            }
+def generation_rate(result, elapsed):
+    """Tokens per second for a generation, from Ollama's eval counters when
+    present, otherwise from the wall time"""
+    eval_count = result.get('eval_count')
+    eval_duration = result.get('eval_duration')
+    if eval_count and eval_duration:
+        return round(eval_count / (eval_duration / 1e9), 1)
+    if eval_count and elapsed > 0:
+        return round(eval_count / elapsed, 1)
+    return None
 
-            new_content = f"---\n{yaml.dump(metadata, default_flow_style=False)}---\n{content}"
 
-            with open(prompt_file, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+def record_test_run(run, model, response_time, ttft_ms, tokens_per_sec):
+    """Log an Ollama test run with its latency metrics"""
+    usage_writer.append({
+        'prompt_id': run['prompt_id'],
+        'action': 'test',
+        'timestamp': datetime.now().isoformat(),
+        'model': model,
+        'response_time': response_time,
+        'ttft_ms': ttft_ms,
+        'tokens_per_sec': tokens_per_sec,
+        'user_agent': run['user_agent'],
+        'ip_address': run['ip_address']
+    })
 
-            # Reload prompts to update the in-memory index
-            prompt_manager.load_prompts()
 
-            return jsonify({
-                'status': 'success',
-                'is_favorite': True
-            })
+def generation_cache_key(payload):
+    return ResponseCache.make_key(payload['model'], payload['prompt'],
+                                  payload.get('options'))
 
-    except Exception as e:
-        print(f"Error toggling favorite: {e}")  # Debug logging
-        import traceback
-        traceback.print_exc()  # Print full traceback for debugging
-        return jsonify({'error': 'Failed to toggle favorite'}), 500
+
+def is_deterministic(options):
+    """Whether generation options give repeatable output: a fixed seed
+    (seed >= 0) or greedy sampling (temperature 0)"""
+    options = options or {}
+    try:
+        if options.get('seed') is not None and int(options['seed']) >= 0:
+            return True
+        if options.get('temperature') is not None and \
+                float(options['temperature']) == 0:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return False
+
+
+def cache_policy(options, data):
+    """Return (read, write) for the response cache on one request.
+
+    Only deterministic generations are cached, unless the caller opts in
+    with cache=true; no_cache skips the lookup but still refreshes the
+    entry.
+    """
+    if response_cache is None:
+        return False, False
+    cacheable = is_truthy(data.get('cache')) or is_deterministic(options)
+    return cacheable and not is_truthy(data.get('no_cache')), cacheable
+
+
+def lookup_cached_generation(payload):
+    """Return a cached result for an identical earlier generation, or None"""
+    if response_cache is None:
+        return None
+    return response_cache.get(generation_cache_key(payload))
+
+
+def store_cached_generation(payload, result):
+    """Remember a finished generation in the response cache"""
+    if response_cache is not None:
+        response_cache.set(generation_cache_key(payload), {
+            name: result.get(name) for name in
+            ('response', 'eval_count', 'eval_duration', 'prompt_eval_count')
+        })
+
+
+def fetch_generation(payload, ollama_config, read_cache=False,
+                     write_cache=False):
+    """Run a non-streamed generation, serving repeats from the cache.
+
+    Returns (result, error); result carries a 'cached' flag, and error is a
+    JSON-ready dict when Ollama answered with a failure status.
+    """
+    if read_cache:
+        cached = lookup_cached_generation(payload)
+        if cached is not None:
+            return dict(cached, cached=True), None
+
+    response = get_ollama_client().generate(
+        payload, timeout=ollama_config.get('timeout', 120))
+    if response.status_code != 200:
+        return None, {
+            'error': f'Ollama request failed: {response.status_code}',
+            'details': response.text
+        }
+
+    result = response.json()
+    if write_cache:
+        store_cached_generation(payload, result)
+    result['cached'] = False
+    return result, None
+
+
+def stream_ollama_test(payload, ollama_config, variables, run, cached=None,
+                       write_cache=False):
+    """Proxy a streamed Ollama generation as Server-Sent Events.
+
+    The caller holds the scheduler slot for the request; a cached result
+    is replayed without contacting Ollama.
+    """
+    yield sse_event('meta', {
+        'model': payload['model'],
+        'processed_prompt': payload['prompt'],
+        'variables_used': variables
+    })
+
+    start_time = time.time()
+    if cached is not None:
+        response_time = int((time.time() - start_time) * 1000)
+        yield sse_event('token', {'text': cached.get('response', '')})
+        yield sse_event('done', {
+            'status': 'success',
+            'model': payload['model'],
+            'response_time': response_time,
+            'ttft_ms': response_time,
+            'tokens_per_sec': generation_rate(cached, 0),
+            'eval_count': cached.get('eval_count'),
+            'cached': True
+        })
+        return
+
+    ttft_ms = None
+    tokens = 0
+    text_parts = []
+    final = {}
+    response = None
+    try:
+        response = get_ollama_client().generate(
+            payload, timeout=ollama_config.get('timeout', 120), stream=True)
+        if response.status_code != 200:
+            yield sse_event('error', {
+                'error': f'Ollama request failed: {response.status_code}',
+                'details': response.text
+            })
+            return
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get('error'):
+                yield sse_event('error', {'error': chunk['error']})
+                return
+            text = chunk.get('response', '')
+            if text:
+                if ttft_ms is None:
+                    ttft_ms = int((time.time() - start_time) * 1000)
+                tokens += 1
+                text_parts.append(text)
+                yield sse_event('token', {'text': text})
+            if chunk.get('done'):
+                final = chunk
+                break
+    except requests.RequestException as e:
+        yield sse_event('error', {
+            'error': 'Failed to connect to Ollama',
+            'details': str(e)
+        })
+        return
+    except ValueError as e:
+        yield sse_event('error', {'error': f'Bad response from Ollama: {e}'})
+        return
+    finally:
+        if response is not None:
+            response.close()
+
+    response_time = int((time.time() - start_time) * 1000)
+    if 'eval_count' not in final:
+        final['eval_count'] = tokens
+    final['response'] = ''.join(text_parts)
+    if write_cache:
+        store_cached_generation(payload, final)
+    tokens_per_sec = generation_rate(
+        final, (response_time - (ttft_ms or 0)) / 1000)
+    record_test_run(run, payload['model'], response_time, ttft_ms,
+                    tokens_per_sec)
+    yield sse_event('done', {
+        'status': 'success',
+        'model': payload['model'],
+        'response_time': response_time,
+        'ttft_ms': ttft_ms,
+        'tokens_per_sec': tokens_per_sec,
+        'eval_count': final.get('eval_count'),
+        'cached': False
+    })
 
 
 @app.route('/api/test-ollama', methods=['POST'])
@@ -618,71 +1461,64 @@ def test_ollama():
             return jsonify({'error': 'Missing prompt_id'}), 400
 
         # Find and read the prompt
-        prompt_file = None
-        for root, dirs, files in os.walk(PROMPTS_DIR):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
-                    relative_path = file_path.replace(
-                        '\\', '/').replace('prompts/', '')
-                    if relative_path == prompt_id:
-                        prompt_file = file_path
-                        break
-            if prompt_file:
-                break
+        prompt_file = find_prompt_file(prompt_id)
 
         if not prompt_file:
             return jsonify({'error': 'Prompt not found'}), 404
 
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Parse content
-        if content.startswith('---'):
-            parts = content.split('---', 2)
-            if len(parts) >= 3:
-                prompt_content = parts[2].strip()
-            else:
-                prompt_content = content
-        else:
-            prompt_content = content
-
         # Process variables
-        processed_content = prompt_content
-        if variables:
-            for var_name, var_value in variables.items():
-                placeholder = f'{{{var_name}}}'
-                processed_content = processed_content.replace(
-                    placeholder, var_value)
+        _, _, processed_content, missing = render_prompt(
+            prompt_file, variables, is_truthy(data.get('strict')))
+        if processed_content is None:
+            return jsonify({'error': 'Missing variables', 'missing_variables': missing}), 400
 
         # Test with Ollama
-        import requests
-        import time
-
-        start_time = time.time()
-
-        # Get Ollama configuration (you'll need to implement this)
         ollama_config = get_ollama_config()
 
-        ollama_url = f"http://{ollama_config.get('host', 'localhost')}:{ollama_config.get('port', 11434)}/api/generate"
-
         payload = {
             "model": ollama_config.get('model', 'llama3.2:1b'),
             "prompt": processed_content,
             "stream": False,
             "options": ollama_config.get('options', {})
         }
+        run = {
+            'prompt_id': prompt_id,
+            'user_agent': request.headers.get('User-Agent', ''),
+            'ip_address': request.remote_addr
+        }
 
-        response = requests.post(
-            ollama_url,
-            json=payload,
-            timeout=ollama_config.get('timeout', 120)
-        )
+        if 'stream' in data:
+            stream = is_truthy(data.get('stream'))
+        else:
+            stream = get_config().get('testing', {}).get('stream_responses', False)
+        read_cache, write_cache = cache_policy(payload['options'], data)
+        if stream:
+            payload['stream'] = True
+            cached = lookup_cached_generation(payload) if read_cache else None
+            # Queue before the stream starts so a full queue is still a 429;
+            # the slot is held until the response is closed
+            scheduler = get_ollama_client().scheduler
+            if cached is None:
+                slot = scheduler.acquire(PRIORITY_INTERACTIVE)
+            response = Response(
+                stream_ollama_test(payload, ollama_config, variables, run,
+                                   cached, write_cache),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+            if cached is None:
+                response.call_on_close(lambda: scheduler.release(slot))
+            return response
+
+        start_time = time.time()
+        result, error = fetch_generation(payload, ollama_config, read_cache,
+                                         write_cache)
 
         response_time = int((time.time() - start_time) * 1000)
 
-        if response.status_code == 200:
-            result = response.json()
+        if error is None:
+            tokens_per_sec = generation_rate(result, response_time / 1000)
+            record_test_run(run, payload['model'], response_time,
+                            None, tokens_per_sec)
 
             return jsonify({
                 'status': 'success',
@@ -690,14 +1526,17 @@ def test_ollama():
                 'processed_prompt': processed_content,
                 'model': payload['model'],
                 'response_time': response_time,
+                'tokens_per_sec': tokens_per_sec,
+                'eval_count': result.get('eval_count'),
+                'cached': result['cached'],
                 'variables_used': variables
             })
         else:
-            return jsonify({
-                'error': f'Ollama request failed: {response.status_code}',
-                'details': response.text
-            }), 500
+            return jsonify(error), 500
 
+    except OllamaBusyError as e:
+        return jsonify({'error': 'Ollama is busy', 'details': str(e)}), \
+            429, {'Retry-After': '5'}
     except requests.RequestException as e:
         return jsonify({
             'error': 'Failed to connect to Ollama',
@@ -708,6 +1547,112 @@ def test_ollama():
         return jsonify({'error': 'Failed to test prompt'}), 500
 
 
+def run_model(model, prompt, ollama_config, read_cache=False,
+              write_cache=False):
+    """Run one non-streamed generation and summarize it for comparison"""
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "options": ollama_config.get('options', {})
+    }
+    start_time = time.time()
+    try:
+        result, error = fetch_generation(payload, ollama_config, read_cache,
+                                         write_cache)
+    except OllamaBusyError as e:
+        return {'model': model, 'status': 'error',
+                'error': 'Ollama is busy', 'details': str(e),
+                'response_time': int((time.time() - start_time) * 1000)}
+    except requests.RequestException as e:
+        return {'model': model, 'status': 'error',
+                'error': 'Failed to connect to Ollama', 'details': str(e),
+                'response_time': int((time.time() - start_time) * 1000)}
+
+    response_time = int((time.time() - start_time) * 1000)
+    if error is not None:
+        return dict(error, model=model, status='error',
+                    response_time=response_time)
+
+    return {
+        'model': model,
+        'status': 'success',
+        'response': result.get('response', ''),
+        'response_time': response_time,
+        'prompt_eval_count': result.get('prompt_eval_count'),
+        'eval_count': result.get('eval_count'),
+        'tokens_per_sec': generation_rate(result, response_time / 1000),
+        'cached': result['cached']
+    }
+
+
+@app.route('/api/compare-models', methods=['POST'])
+def compare_models():
+    """Run a prompt against several models concurrently"""
+    try:
+        data = request.get_json()
+        prompt_id = data.get('prompt_id')
+        variables = data.get('variables', {})
+
+        if not prompt_id:
+            return jsonify({'error': 'Missing prompt_id'}), 400
+
+        prompt_file = find_prompt_file(prompt_id)
+        if not prompt_file:
+            return jsonify({'error': 'Prompt not found'}), 404
+
+        # Render once; every model gets the same prompt
+        _, _, processed_content, missing = render_prompt(
+            prompt_file, variables, is_truthy(data.get('strict')))
+        if processed_content is None:
+            return jsonify({'error': 'Missing variables', 'missing_variables': missing}), 400
+
+        ollama_config = get_ollama_config()
+        models = data.get('models') or \
+            [ollama_config['default_model']] + list(ollama_config['fallback_models'])
+        if not isinstance(models, list) or \
+                not all(isinstance(model, str) for model in models):
+            return jsonify({'error': 'models must be a list of names'}), 400
+        models = list(dict.fromkeys(models))
+        if len(models) > MAX_COMPARE_MODELS:
+            return jsonify({'error': f'At most {MAX_COMPARE_MODELS} models per comparison'}), 400
+
+        run = {
+            'prompt_id': prompt_id,
+            'user_agent': request.headers.get('User-Agent', ''),
+            'ip_address': request.remote_addr
+        }
+
+        # Wall time is the slowest model rather than the sum of all of them
+        read_cache, write_cache = cache_policy(ollama_config.get('options'), data)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(models)) as pool:
+            results = list(pool.map(
+                lambda model: run_model(model, processed_content,
+                                        ollama_config, read_cache,
+                                        write_cache),
+                models))
+        wall_time = int((time.time() - start_time) * 1000)
+
+        for result in results:
+            if result['status'] == 'success':
+                record_test_run(run, result['model'], result['response_time'],
+                                None, result['tokens_per_sec'])
+
+        return jsonify({
+            'status': 'success',
+            'processed_prompt': processed_content,
+            'variables_used': variables,
+            'results': results,
+            'wall_time': wall_time,
+            'total_model_time': sum(result['response_time'] for result in results)
+        })
+
+    except Exception as e:
+        print(f"Error comparing models: {e}")
+        return jsonify({'error': 'Failed to compare models'}), 500
+
+
 def get_config():
     """Get unified configuration from config.json"""
     config_path = Path('../config/config.json')
@@ -723,6 +1668,10 @@ def get_config():
             "port": 11434,
             "enabled": True,
             "timeout": 30,
+            "connect_timeout": 10,
+            "max_concurrent": 2,
+            "max_queue": 16,
+            "queue_timeout": 60,
             "default_model": "llama3.2:1b",
             "model_options": {
                 "temperature": 0.7,
@@ -736,12 +1685,31 @@ def get_config():
             "enabled": True,
             "model": "llama3.2:1b",
             "max_response_length": 1024,
-            "response_timeout": 60
+            "response_timeout": 60,
+            "stream_responses": False
         },
         "features": {
             "ollama_testing": True,
             "usage_tracking": True,
             "favorites": True
+        },
+        "performance": {
+            "max_file_size": "10MB",
+            "load_workers": 1,
+            "load_executor": "process",
+            "usage_flush_interval": 30,
+            "usage_write_interval": 1,
+            "usage_fsync": "none",
+            "usage_store": "jsonl",
+            "metadata_sidecar": False,
+            "watch_prompts": True,
+            "watch_interval": 2,
+            "watch_batch_size": 50,
+            "enable_caching": True,
+            "cache_ttl": 3600
+        },
+        "logging": {
+            "max_log_size": "50MB"
         }
     }
 
@@ -764,6 +1732,23 @@ def get_config():
     return default_config
 
 
+def parse_size(value, default=None):
+    """Convert a size like '10MB' or 1024 into bytes"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*$', str(value).upper())
+    if not match:
+        return default
+    number, unit = match.groups()
+    multiplier = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2,
+                  'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3,
+                  'T': 1024 ** 4, 'TB': 1024 ** 4}[unit]
+    return int(float(number) * multiplier)
+
+
 def get_ollama_config():
     """Get Ollama configuration from unified config file"""
     config = get_config()
@@ -775,7 +1760,13 @@ def get_ollama_config():
         'host': ollama_config.get('host', 'localhost'),
         'port': ollama_config.get('port', 11434),
         'model': testing_config.get('model', ollama_config.get('default_model', 'llama3.2:1b')),
+        'default_model': ollama_config.get('default_model', 'llama3.2:1b'),
+        'fallback_models': ollama_config.get('fallback_models', []),
         'timeout': testing_config.get('response_timeout', ollama_config.get('timeout', 120)),
+        'connect_timeout': ollama_config.get('connect_timeout', 10),
+        'max_concurrent': ollama_config.get('max_concurrent', 2),
+        'max_queue': ollama_config.get('max_queue', 16),
+        'queue_timeout': ollama_config.get('queue_timeout', 60),
         'options': ollama_config.get('model_options', {
             'temperature': 0.7,
             'num_predict': 1024,
@@ -786,94 +1777,75 @@ def get_ollama_config():
     }
 
 
+def get_ollama_client():
+    """Return the shared pooled Ollama client for the configured server"""
+    ollama_config = get_ollama_config()
+    return get_client(ollama_config['host'], ollama_config['port'],
+                      ollama_config['timeout'], ollama_config['connect_timeout'],
+                      ollama_config['max_concurrent'],
+                      ollama_config['max_queue'],
+                      ollama_config['queue_timeout'])
+
+
+@app.route('/api/debug/ollama')
+def ollama_metrics():
+    """Report Ollama request counts, connection reuse and queue state"""
+    return jsonify({
+        'clients': all_metrics(),
+        'response_cache': response_cache.stats() if response_cache else None
+    })
+
+
 @app.route('/api/search-prompts')
 def search_prompts():
-    """Enhanced search API with filtering"""
+    """Enhanced search API with filtering, served from the in-memory index"""
     try:
         query = request.args.get('q', '').strip()
         category = request.args.get('category', '').strip()
         tags = request.args.get('tags', '').strip()
         favorites_only = request.args.get('favorites', '').lower() == 'true'
 
-        prompts = []
-
-        # Walk through prompt files
-        for root, dirs, files in os.walk(PROMPTS_DIR):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
-
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-
-                    # Parse metadata
-                    metadata = {}
-                    prompt_content = content
-
-                    if content.startswith('---'):
-                        parts = content.split('---', 2)
-                        if len(parts) >= 3:
-                            try:
-                                metadata = yaml.safe_load(parts[1]) or {}
-                                prompt_content = parts[2].strip()
-                            except yaml.YAMLError:
-                                pass
-
-                    # Apply filters
-                    if favorites_only and not metadata.get('favorite', False):
-                        continue
-
-                    if category and metadata.get('category', '').lower() != category.lower():
-                        continue
-
-                    if tags:
-                        prompt_tags = [tag.lower()
-                                       for tag in metadata.get('tags', [])]
-                        search_tags = [tag.strip().lower()
-                                       for tag in tags.split(',')]
-                        if not any(tag in prompt_tags for tag in search_tags):
-                            continue
-
-                    # Search in content and metadata
-                    if query:
-                        search_text = f"{metadata.get('title', '')} {prompt_content} {' '.join(metadata.get('tags', []))}".lower(
-                        )
-                        if query.lower() not in search_text:
-                            continue
-
-                    # Build prompt object
-                    prompt = {
-                        'id': file_path.replace('\\', '/').replace('prompts/', ''),
-                        'filename': file,
-                        'title': metadata.get('title', file.replace('.md', '')),
-                        'category': metadata.get('category', 'uncategorized'),
-                        'tags': metadata.get('tags', []),
-                        'content': prompt_content,
-                        'variables': metadata.get('variables', []),
-                        'favorite': metadata.get('favorite', False),
-                        'use_count': metadata.get('use_count', 0),
-                        'last_used': metadata.get('last_used', ''),
-                        'created': metadata.get('created', ''),
-                        'file_path': file_path
-                    }
-
-                    prompts.append(prompt)
+        search_tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        matches = prompt_manager.filter_prompts(
+            query, category, search_tags, favorites_only)
 
         # Sort by relevance, favorites, then usage
-        def sort_key(p):
+        def sort_key(match):
+            metadata, relevance = match
             score = 0
-            if p['favorite']:
+            if metadata.get('favorite', False):
                 score += 1000
-            score += p['use_count'] * 10
-            if query and query.lower() in p['title'].lower():
+            score += (metadata.get('use_count') or 0) * 10
+            title = str(metadata.get('title', metadata['id']))
+            if query and query.lower() in title.lower():
                 score += 100
-            return score
+            return (score, relevance)
+
+        def build_prompt(match):
+            metadata, relevance = match
+            file_path = metadata['file_path']
+            return {
+                'id': prompt_manager.relative_id(file_path),
+                'filename': os.path.basename(file_path),
+                'title': metadata.get('title', metadata['id']),
+                'category': metadata.get('category', 'uncategorized'),
+                'tags': metadata.get('tags', []),
+                'content': metadata.get('content', ''),
+                'variables': metadata.get('variables', []),
+                'favorite': metadata.get('favorite', False),
+                'use_count': metadata.get('use_count', 0),
+                'last_used': metadata.get('last_used', ''),
+                'created': metadata.get('created', ''),
+                'file_path': file_path,
+                'relevance': round(relevance, 2)
+            }
 
-        prompts.sort(key=sort_key, reverse=True)
+        matches.sort(key=sort_key, reverse=True)
+        page, pagination = paginate_results(matches, query, build_prompt)
 
         return jsonify({
-            PROMPTS_DIR: prompts,
-            'total': len(prompts),
+            'prompts': page,
+            **pagination,
             'query': query,
             'filters': {
                 'category': category,
@@ -891,39 +1863,118 @@ def search_prompts():
 def get_categories():
     """Get all available categories with counts"""
     try:
-        categories = {}
+        def build():
+            categories = prompt_manager.category_counts()
+            return jsonify({
+                'categories': [
+                    {'name': name, 'count': count}
+                    for name, count in sorted(categories.items())
+                ],
+                'total_categories': len(categories)
+            })
 
-        for root, dirs, files in os.walk(PROMPTS_DIR):
-            for file in files:
-                if file.endswith('.md'):
-                    file_path = os.path.join(root, file)
+        return conditional_response(prompt_manager.index_etag(),
+                                    prompt_manager.last_modified(), build)
 
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
+    except Exception as e:
+        print(f"Categories error: {e}")
+        return jsonify({'error': 'Failed to get categories'}), 500
 
-                    metadata = {}
-                    if content.startswith('---'):
-                        parts = content.split('---', 2)
-                        if len(parts) >= 3:
-                            try:
-                                metadata = yaml.safe_load(parts[1]) or {}
-                            except yaml.YAMLError:
-                                pass
 
-                    category = metadata.get('category', 'uncategorized')
-                    categories[category] = categories.get(category, 0) + 1
+def create_prompt_manager():
+    """Build the prompt manager using the performance settings"""
+    performance = get_config().get('performance', {})
+    sidecar = None
+    if performance.get('metadata_sidecar', False):
+        sidecar = MetadataSidecar(SIDECAR_FILE)
+    return PromptManager(
+        PROMPTS_DIR,
+        snapshot_path=SNAPSHOT_FILE,
+        workers=performance.get('load_workers', 1),
+        executor=performance.get('load_executor', 'process'),
+        max_file_size=parse_size(performance.get('max_file_size')),
+        sidecar=sidecar
+    )
 
-        return jsonify({
-            'categories': [
-                {'name': name, 'count': count}
-                for name, count in sorted(categories.items())
-            ],
-            'total_categories': len(categories)
-        })
 
+# Initialize prompt manager
+prompt_manager = create_prompt_manager()
+atexit.register(prompt_manager.save_snapshot)
+
+# Buffer use_count/last_used updates and write them behind the requests
+usage_buffer = UsageCounterBuffer(
+    update_prompt_usage,
+    interval=get_config().get('performance', {}).get('usage_flush_interval', 30)
+).start()
+atexit.register(usage_buffer.stop)
+
+
+def compact_usage_log():
+    """Fold closed segments into the rollups, then archive old ones"""
+    try:
+        usage_rollups.refresh(usage_store.segments())
+        usage_store.archive()
     except Exception as e:
-        print(f"Categories error: {e}")
-        return jsonify({'error': 'Failed to get categories'}), 500
+        print(f"Error compacting usage log: {e}")
+
+
+def create_usage_store():
+    """Build the usage store selected by performance.usage_store"""
+    backend = get_config().get('performance', {}).get('usage_store', 'jsonl')
+    if backend == 'sqlite':
+        return SQLiteUsageStore(USAGE_DB_FILE), None
+    if backend != 'jsonl':
+        print(f"Unknown usage store {backend!r}, using jsonl")
+
+    # Daily usage log segments, split at logging.max_log_size
+    log = UsageLog(
+        USAGE_LOG_DIR,
+        max_bytes=parse_size(get_config().get('logging', {}).get('max_log_size')),
+        legacy_path=LEGACY_USAGE_LOG,
+        on_rotate=compact_usage_log
+    )
+    return log, UsageRollups(USAGE_ROLLUPS_FILE)
+
+
+usage_store, usage_rollups = create_usage_store()
+
+
+def create_response_cache():
+    """Build the Ollama response cache if performance.enable_caching is on"""
+    performance = get_config().get('performance', {})
+    if not performance.get('enable_caching', True):
+        return None
+    return ResponseCache(ttl=performance.get('cache_ttl', 3600),
+                         directory=RESPONSE_CACHE_DIR)
+
+
+response_cache = create_response_cache()
+
+# Usage events are queued by the requests and appended in batches
+usage_writer = AsyncUsageWriter(
+    usage_store,
+    interval=get_config().get('performance', {}).get('usage_write_interval', 1),
+    fsync=get_config().get('performance', {}).get('usage_fsync', 'none')
+).start()
+atexit.register(usage_writer.stop)
+
+
+def start_prompt_watcher():
+    """Start the background watcher that keeps the prompt index in sync"""
+    performance = get_config().get('performance', {})
+    if not performance.get('watch_prompts', True):
+        return None
+
+    watcher = PromptWatcher(
+        prompt_manager,
+        interval=performance.get('watch_interval', 2),
+        batch_size=performance.get('watch_batch_size', 50)
+    )
+    watcher.start()
+    return watcher
+
+
+prompt_watcher = start_prompt_watcher()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+"""
+Cognitrix prompt loader
+Reads and parses prompt files, optionally fanning the work out over a
+thread or process pool. Kept free of Flask and app state so process pool
+workers only need to import this module.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from frontmatter_parser import load_frontmatter
+
+# Below this many files a pool costs more than it saves
+PARALLEL_THRESHOLD = 64
+
+
+def parse_prompt_file(file_path):
+    """Parse markdown file with YAML frontmatter.
+
+    Files without usable frontmatter are still returned, with only a title
+    taken from the file name, so they stay searchable and are counted as
+    uncategorized.
+    """
+    file_path = Path(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    frontmatter = None
+    prompt_content = content
+
+    # Split frontmatter and content
+    if content.startswith('---'):
+        parts = content.split('---', 2)
+        if len(parts) >= 3:
+            try:
+                frontmatter = load_frontmatter(parts[1])
+                prompt_content = parts[2].strip()
+            except yaml.YAMLError as e:
+                print(f"YAML error in {file_path}: {e}")
+
+    if not isinstance(frontmatter, dict):
+        frontmatter = {'title': file_path.stem}
+
+    frontmatter['content'] = prompt_content
+    frontmatter['file_path'] = str(file_path)
+    frontmatter['id'] = str(file_path.stem)
+
+    return frontmatter
+
+
+def _parse_safely(file_path):
+    """Parse one file, returning (prompt_data, error) instead of raising"""
+    try:
+        return parse_prompt_file(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _parse_chunk(paths):
+    """Parse a list of files in one worker call"""
+    return [_parse_safely(path) for path in paths]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resolve_workers(workers):
+    """Turn a configured worker count into a usable one (0 means all CPUs)"""
+    try:
+        workers = int(workers)
+    except (TypeError, ValueError):
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def parse_prompt_files(paths, workers=1, executor='process'):
+    """Parse many prompt files, returning [(prompt_data, error)] in the
+    same order as paths so callers can merge results deterministically.
+
+    The process executor forks, so only use it before the calling process
+    has started any other threads.
+    """
+    paths = [str(path) for path in paths]
+    workers = min(resolve_workers(workers), max(len(paths), 1))
+    if workers <= 1 or len(paths) < PARALLEL_THRESHOLD:
+        return [_parse_safely(path) for path in paths]
+
+    # Hand out a few chunks per worker so IPC stays cheap but a slow chunk
+    # does not leave the other workers idle
+    chunk_size = max(1, len(paths) // (workers * 4))
+    chunks = list(_chunks(paths, chunk_size))
+
+    if executor == 'process':
+        try:
+            # fork avoids re-importing the Flask app in every worker
+            context = multiprocessing.get_context('fork')
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=context)
+        except (ValueError, OSError) as e:
+            print(f"Process pool unavailable, using threads: {e}")
+            pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    results = []
+    with pool:
+        for chunk_results in pool.map(_parse_chunk, chunks):
+            results.extend(chunk_results)
+    return results
@@ -0,0 +1,50 @@
+"""
+Cognitrix prompt renderer
+Compiles prompt content into literal and placeholder segments once, so
+substituting {variable} placeholders is a single join.
+"""
+
+import re
+
+PLACEHOLDER_RE = re.compile(r'\{([^{}\n]+)\}')
+VARIABLE_NAME_RE = re.compile(r'^\w+$')
+
+
+def compile_template(text):
+    """Split text into segments: literals at even indexes, placeholder
+    names at odd ones"""
+    return tuple(PLACEHOLDER_RE.split(text))
+
+
+def placeholder_names(segments):
+    """Return the distinct placeholder names of a compiled template"""
+    return list(dict.fromkeys(segments[1::2]))
+
+
+def render_segments(segments, variables):
+    """Substitute variables into a compiled template in one pass.
+
+    Placeholders without a value are kept as written, and substituted
+    values are never scanned for further placeholders.
+    """
+    if len(segments) == 1:
+        return segments[0]
+    variables = variables or {}
+    parts = list(segments)
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        if name in variables:
+            parts[i] = str(variables[name])
+        else:
+            parts[i] = '{' + name + '}'
+    return ''.join(parts)
+
+
+def missing_variables(segments, variables):
+    """Return identifier-like placeholder names that have no value.
+
+    Other brace groups, such as code samples or LaTeX, are not reported.
+    """
+    variables = variables or {}
+    return [name for name in placeholder_names(segments)
+            if VARIABLE_NAME_RE.match(name) and name not in variables]
@@ -0,0 +1,271 @@
+"""
+Cognitrix search index
+Tokenized inverted index with BM25F-style ranking over prompt fields.
+"""
+
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    if isinstance(text, (list, tuple, set)):
+        text = ' '.join(str(item) for item in text if item is not None)
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def make_snippet(text, query, width=160):
+    """Cut a window of text around the first query match.
+
+    Returns {'text': ..., 'highlights': [[start, end], ...]} where the
+    offsets point into the snippet text. Query tokens match word
+    prefixes, case-insensitively.
+    """
+    text = str(text or '')
+    tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+    if not tokens:
+        snippet = text[:width]
+        return {'text': snippet, 'highlights': [], 'offset': 0,
+                'truncated': len(text) > width}
+
+    pattern = re.compile(
+        r'\b(?:' + '|'.join(re.escape(token) for token in tokens) + r')\w*',
+        re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        start = 0
+    else:
+        # Put the first match roughly a third of the way into the window
+        start = max(0, first.start() - width // 3)
+        if start:
+            space = text.rfind(' ', 0, start)
+            if space != -1 and start - space < 20:
+                start = space + 1
+    end = min(len(text), start + width)
+
+    snippet = text[start:end]
+    highlights = [[m.start(), min(m.end(), len(snippet))]
+                  for m in pattern.finditer(snippet)]
+    return {
+        'text': snippet,
+        'highlights': highlights,
+        'offset': start,
+        'truncated': start > 0 or end < len(text)
+    }
+
+
+class SearchIndex:
+    """Inverted index mapping terms to per-field term frequencies"""
+
+    # Relative field importance, same ordering as the old 10/5/3/2 weights
+    FIELDS = ('title', 'tags', 'category', 'content')
+    FIELD_WEIGHTS = (3.0, 2.0, 1.5, 1.0)
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}      # term -> {doc_id: (tf per field)}
+        self.doc_lengths = {}   # doc_id -> (length per field)
+        self.doc_terms = {}     # doc_id -> terms, needed for removal
+        self.total_lengths = [0] * len(self.FIELDS)
+        self._vocabulary = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id, fields):
+        """Index a document, replacing any previous version"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        field_counts = [Counter(tokenize(fields.get(name)))
+                        for name in self.FIELDS]
+        lengths = tuple(sum(counts.values()) for counts in field_counts)
+
+        terms = set()
+        for counts in field_counts:
+            terms.update(counts)
+
+        for term in terms:
+            tfs = tuple(counts.get(term, 0) for counts in field_counts)
+            self.postings.setdefault(term, {})[doc_id] = tfs
+
+        self.doc_lengths[doc_id] = lengths
+        self.doc_terms[doc_id] = tuple(terms)
+        for i, length in enumerate(lengths):
+            self.total_lengths[i] += length
+        self._vocabulary = None
+
+    def remove(self, doc_id):
+        """Drop a document from the index"""
+        lengths = self.doc_lengths.pop(doc_id, None)
+        if lengths is None:
+            return
+
+        for term in self.doc_terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+                self._vocabulary = None
+
+        for i, length in enumerate(lengths):
+            self.total_lengths[i] -= length
+
+    def clear(self):
+        """Remove every document"""
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_lengths = [0] * len(self.FIELDS)
+        self._vocabulary = None
+
+    def _expand_prefix(self, prefix):
+        """Return indexed terms starting with prefix"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+
+        terms = []
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            terms.append(vocabulary[i])
+            i += 1
+        return terms
+
+    def search(self, query, limit=None):
+        """Rank documents for a query, returning (doc_id, score) pairs.
+
+        The last query token is also matched as a prefix so partially
+        typed words still find results.
+        """
+        tokens = tokenize(query)
+        if not tokens or not self.doc_lengths:
+            return []
+
+        query_terms = set(tokens)
+        query_terms.update(self._expand_prefix(tokens[-1]))
+
+        doc_count = len(self.doc_lengths)
+        avg_lengths = [max(total / doc_count, 1e-9)
+                       for total in self.total_lengths]
+        weights = self.FIELD_WEIGHTS
+        k1 = self.k1
+        b = self.b
+
+        scores = {}
+        for term in query_terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+
+            df = len(docs)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+            for doc_id, tfs in docs.items():
+                lengths = self.doc_lengths[doc_id]
+                tf = 0.0
+                for i, field_tf in enumerate(tfs):
+                    if field_tf:
+                        norm = 1 - b + b * lengths[i] / avg_lengths[i]
+                        tf += weights[i] * field_tf / norm
+                scores[doc_id] = scores.get(doc_id, 0.0) + \
+                    idf * tf * (k1 + 1) / (tf + k1)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
+
+
+class FacetIndex:
+    """Precomputed category, tag and favorite sets for fast filtering"""
+
+    def __init__(self):
+        self.categories = {}    # lowercase category -> doc ids
+        self.tags = {}          # lowercase tag -> doc ids
+        self.favorites = set()
+        self.category_counts = Counter()
+        self.doc_facets = {}    # doc_id -> (category, tags, favorite)
+
+    def __len__(self):
+        return len(self.doc_facets)
+
+    def add(self, doc_id, category, tags=(), favorite=False):
+        """Record a document's facet values, replacing any previous ones"""
+        if doc_id in self.doc_facets:
+            self.remove(doc_id)
+
+        category = str(category or 'uncategorized')
+        tags = tuple(sorted({str(tag).lower() for tag in tags or ()}))
+        favorite = bool(favorite)
+
+        self.categories.setdefault(category.lower(), set()).add(doc_id)
+        self.category_counts[category] += 1
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(doc_id)
+        if favorite:
+            self.favorites.add(doc_id)
+        self.doc_facets[doc_id] = (category, tags, favorite)
+
+    def remove(self, doc_id):
+        """Forget a document's facet values"""
+        facets = self.doc_facets.pop(doc_id, None)
+        if facets is None:
+            return
+        category, tags, favorite = facets
+
+        self._discard(self.categories, category.lower(), doc_id)
+        self.category_counts[category] -= 1
+        if self.category_counts[category] <= 0:
+            del self.category_counts[category]
+        for tag in tags:
+            self._discard(self.tags, tag, doc_id)
+        self.favorites.discard(doc_id)
+
+    def clear(self):
+        """Remove every document"""
+        self.__init__()
+
+    @staticmethod
+    def _discard(buckets, name, doc_id):
+        bucket = buckets.get(name)
+        if bucket is not None:
+            bucket.discard(doc_id)
+            if not bucket:
+                del buckets[name]
+
+    def filter(self, category=None, tags=None, favorites_only=False):
+        """Return the doc ids matching every given facet, or None if no
+        facet was given. Tags match if any of them is present.
+        """
+        sets = []
+        if favorites_only:
+            sets.append(self.favorites)
+        if category:
+            sets.append(self.categories.get(category.lower(), set()))
+        if tags:
+            matched = set()
+            for tag in tags:
+                matched |= self.tags.get(tag.lower(), set())
+            sets.append(matched)
+
+        if not sets:
+            return None
+
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+        return result
@@ -0,0 +1,85 @@
+"""
+Cognitrix metadata sidecar
+Keeps frequently changing prompt fields (favorite, usage counters) in one
+append-only log instead of rewriting each prompt file's frontmatter.
+"""
+
+import os
+import json
+import threading
+
+from frontmatter_parser import atomic_write
+
+
+class MetadataSidecar:
+    """Append-only store of mutable prompt fields, keyed by prompt id.
+
+    Every update appends one JSON line; replaying the log in order gives the
+    current state. Once the log holds compact_ratio times more lines than
+    there are prompts in it, it is rewritten with one line per prompt.
+    """
+
+    FIELDS = ('favorite', 'use_count', 'last_used', 'last_modified')
+
+    def __init__(self, path, compact_ratio=4, min_compact_lines=1000):
+        self.path = str(path)
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+        self.state = {}  # prompt id -> {field: value}
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+                prompt_id = record.pop('id')
+            except (ValueError, KeyError, AttributeError):
+                continue  # Torn write from a crash
+            self.state.setdefault(prompt_id, {}).update(record)
+            self._lines += 1
+
+        # A torn last line would corrupt the next append; rewrite the log
+        if content and not content.endswith('\n'):
+            self.compact()
+
+    def get(self, prompt_id):
+        """Return the stored fields for a prompt, or None"""
+        return self.state.get(prompt_id)
+
+    def update(self, prompt_id, fields):
+        """Record new values for some of a prompt's mutable fields"""
+        fields = {name: value for name, value in fields.items()
+                  if name in self.FIELDS}
+        if not fields:
+            return
+
+        line = json.dumps({'id': prompt_id, **fields}) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.state.setdefault(prompt_id, {}).update(fields)
+            self._lines += 1
+            if self._lines >= max(self.min_compact_lines,
+                                  self.compact_ratio * len(self.state)):
+                self._compact()
+
+    def compact(self):
+        """Rewrite the log with a single line per prompt"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        data = ''.join(json.dumps({'id': prompt_id, **fields}) + '\n'
+                       for prompt_id, fields in sorted(self.state.items()))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        atomic_write(self.path, data)
+        self._lines = len(self.state)
@@ -0,0 +1,170 @@
+// Ollama test helpers shared by the prompt and category pages
+
+// Run a prompt test. Streamed (Server-Sent Events) responses are passed to
+// handlers.onMeta / handlers.onToken as they arrive; either way the promise
+// resolves with the complete result in the same shape as the JSON response.
+async function runOllamaTest(body, handlers = {}) {
+    const response = await fetch('/api/test-ollama', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream, application/json'
+        },
+        body: JSON.stringify(body)
+    });
+
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!contentType.startsWith('text/event-stream')) {
+        if (!response.ok) {
+            throw new Error('Failed to test with Ollama');
+        }
+        return await response.json();
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result = { response: '' };
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            const payload = data ? JSON.parse(data) : {};
+
+            if (eventName === 'meta') {
+                Object.assign(result, payload);
+                if (handlers.onMeta) handlers.onMeta(result);
+            } else if (eventName === 'token') {
+                result.response += payload.text;
+                if (handlers.onToken) handlers.onToken(payload.text, result);
+            } else if (eventName === 'done') {
+                Object.assign(result, payload);
+            } else if (eventName === 'error') {
+                throw new Error(payload.error || 'Failed to test with Ollama');
+            }
+        }
+    }
+    return result;
+}
+
+// Show a test result in a modal. Returns handles to append streamed text
+// and to fill in the timing line once the run has finished.
+function showOllamaResult(result) {
+    const modal = document.createElement('div');
+    modal.className = 'modal fade';
+    modal.innerHTML = `
+        <div class="modal-dialog modal-lg">
+            <div class="modal-content bg-dark text-light">
+                <div class="modal-header">
+                    <h5 class="modal-title">Ollama Test Result</h5>
+                    <button type="button" class="btn-close btn-close-white" data-bs-dismiss="modal"></button>
+                </div>
+                <div class="modal-body">
+                    <div class="mb-3">
+                        <strong>Prompt:</strong>
+                        <pre class="bg-secondary p-2 rounded ollama-prompt"></pre>
+                    </div>
+                    <div class="mb-3">
+                        <strong>Response:</strong>
+                        <div class="bg-secondary p-3 rounded ollama-response" style="max-height: 400px; overflow-y: auto; white-space: pre-wrap;"></div>
+                    </div>
+                    <small class="text-muted ollama-metrics">
+                        <i class="fas fa-spinner fa-spin me-1"></i>Generating...
+                    </small>
+                </div>
+                <div class="modal-footer">
+                    <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Close</button>
+                    <button type="button" class="btn btn-outline-light ollama-regenerate-btn d-none"
+                            title="Skip the cached response and run the prompt again">
+                        Regenerate
+                    </button>
+                    <button type="button" class="btn btn-primary ollama-copy-btn">
+                        Copy Response
+                    </button>
+                </div>
+            </div>
+        </div>
+    `;
+
+    const responseElement = modal.querySelector('.ollama-response');
+    modal.querySelector('.ollama-prompt').textContent = result.processed_prompt || '';
+    responseElement.textContent = result.response || '';
+    modal.querySelector('.ollama-copy-btn').addEventListener('click', function() {
+        copyToClipboard(responseElement.textContent, this);
+    });
+
+    document.body.appendChild(modal);
+    const bsModal = new bootstrap.Modal(modal);
+    bsModal.show();
+
+    // Remove modal from DOM when hidden
+    modal.addEventListener('hidden.bs.modal', function() {
+        document.body.removeChild(modal);
+    });
+
+    return {
+        appendResponse(text) {
+            responseElement.textContent += text;
+            responseElement.scrollTop = responseElement.scrollHeight;
+        },
+        finish(finalResult) {
+            responseElement.textContent = finalResult.response || '';
+            const parts = [`Response time: ${finalResult.response_time}ms`];
+            if (finalResult.ttft_ms != null) {
+                parts.push(`First token: ${finalResult.ttft_ms}ms`);
+            }
+            if (finalResult.tokens_per_sec != null) {
+                parts.push(`${finalResult.tokens_per_sec} tokens/sec`);
+            }
+            parts.push(`Model: ${finalResult.model}`);
+            if (finalResult.cached) {
+                parts.push('cached');
+            }
+            modal.querySelector('.ollama-metrics').textContent = parts.join(' | ');
+        },
+        // Show a button that re-runs the test without the response cache
+        offerRegenerate(regenerate) {
+            const button = modal.querySelector('.ollama-regenerate-btn');
+            button.classList.remove('d-none');
+            button.addEventListener('click', function() {
+                bsModal.hide();
+                regenerate().catch(error => console.error('Ollama test failed:', error));
+            });
+        }
+    };
+}
+
+// Test a prompt with Ollama, rendering streamed output as it arrives.
+// Pass noCache to skip the server's response cache.
+async function testPromptWithOllama(promptId, variables, noCache = false) {
+    let view = null;
+    const result = await runOllamaTest(
+        { prompt_id: promptId, variables: variables, no_cache: noCache },
+        {
+            onMeta: meta => { view = showOllamaResult(meta); },
+            onToken: text => view.appendResponse(text)
+        }
+    );
+    if (!view) {
+        view = showOllamaResult(result);
+    }
+    view.finish(result);
+    if (result.cached) {
+        view.offerRegenerate(() => testPromptWithOllama(promptId, variables, true));
+    }
+    return result;
+}
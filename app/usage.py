@@ -0,0 +1,646 @@
+"""
+Cognitrix usage tracking
+In-memory buffering of per-prompt usage counters with write-behind flushes,
+an asynchronous batched usage event writer, a segmented usage log with
+incrementally maintained rollups, and an optional SQLite usage store.
+"""
+
+import os
+import re
+import gzip
+import json
+import queue
+import heapq
+import shutil
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from frontmatter_parser import atomic_write
+
+SEGMENT_RE = re.compile(
+    r'^usage-(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.jsonl(\.gz)?$')
+RECENT_ACTIVITY_SIZE = 10
+TOP_PROMPTS_WINDOW_DAYS = 30
+
+
+class UsageCounterBuffer:
+    """Coalesce prompt usage updates and flush them in batches.
+
+    record() only touches memory. A background thread calls
+    flush_fn(file_path, count, last_used) once per file every interval
+    seconds, so many copies of the same prompt become a single write.
+    """
+
+    def __init__(self, flush_fn, interval=30):
+        self.flush_fn = flush_fn
+        self.interval = max(float(interval), 0.1)
+        self._pending = {}  # file path -> [count, last_used]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def record(self, file_path, last_used, count=1):
+        """Count uses of a prompt file"""
+        with self._lock:
+            entry = self._pending.setdefault(str(file_path), [0, last_used])
+            entry[0] += count
+            entry[1] = last_used
+
+    def pending(self, file_path):
+        """Return the number of unflushed uses for a prompt file"""
+        with self._lock:
+            entry = self._pending.get(str(file_path))
+            return entry[0] if entry else 0
+
+    def flush(self):
+        """Write every pending counter, returning the number of files written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+
+            written = 0
+            for file_path, (count, last_used) in batch.items():
+                try:
+                    self.flush_fn(file_path, count, last_used)
+                    written += 1
+                except Exception as e:
+                    print(f"Error flushing usage for {file_path}: {e}")
+                    # Put the counts back so they are retried next time
+                    with self._lock:
+                        entry = self._pending.setdefault(
+                            file_path, [0, last_used])
+                        entry[0] += count
+            return written
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='cognitrix-usage-flush', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still pending"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+
+class AsyncUsageWriter:
+    """Queue usage events and write them to a log in batches.
+
+    Requests only enqueue. A background thread collects events for up to
+    interval seconds and hands them to log.write() in one call, so a burst
+    of clicks costs one open/append instead of one per event. fsync
+    is 'none' (leave it to the OS) or 'batch' (fsync after every batch).
+    """
+
+    FSYNC_POLICIES = ('none', 'batch')
+
+    def __init__(self, log, interval=1.0, fsync='none', max_batch=1000):
+        if fsync not in self.FSYNC_POLICIES:
+            print(f"Unknown usage fsync policy {fsync!r}, using 'none'")
+            fsync = 'none'
+        self.log = log
+        self.interval = max(float(interval), 0.01)
+        self.fsync = fsync
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stop_marker = object()
+        self._thread = None
+
+    def append(self, entry):
+        """Queue one usage entry for writing"""
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Queue several usage entries to be written together"""
+        if not entries:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            # No writer running (not started or already stopped)
+            self._write(list(entries))
+            return
+        self._queue.put(list(entries))
+
+    def flush(self, timeout=5):
+        """Wait until everything queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            self._drain()
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='cognitrix-usage-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Write everything still queued and stop the writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._stop_marker)
+            self._thread.join(timeout=self.interval + 5)
+        self._drain()
+
+    def _write(self, entries):
+        try:
+            self.log.write(entries, fsync=self.fsync == 'batch')
+        except Exception as e:
+            print(f"Error writing {len(entries)} usage events: {e}")
+
+    def _drain(self):
+        """Synchronously write whatever is left in the queue"""
+        entries = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not self._stop_marker:
+                entries.extend(item)
+        self._write(entries)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            # Gather events for up to interval seconds after the first one;
+            # a flush or stop request writes the batch straight away
+            deadline = time.monotonic() + self.interval
+            batch, waiters, stopping = [], [], False
+            while True:
+                if item is self._stop_marker:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.extend(item)
+                remaining = deadline - time.monotonic()
+                if stopping or waiters or remaining <= 0 or \
+                        len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stopping:
+                return
+
+
+class UsageLog:
+    """Usage log written as daily segment files.
+
+    A segment is split into numbered parts once it reaches max_bytes.
+    segments.json indexes the day and part of every segment, so windowed
+    reads only open the segments that can hold matching entries, and
+    segments older than archive_after_days are gzipped in the background.
+    """
+
+    INDEX_NAME = 'segments.json'
+
+    def __init__(self, directory, max_bytes=None, archive_after_days=1,
+                 legacy_path=None, on_rotate=None):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.archive_after_days = archive_after_days
+        self.legacy_path = str(legacy_path) if legacy_path else None
+        self.on_rotate = on_rotate
+        self._lock = threading.RLock()
+        self._segments = self._load_index()
+        self._active_size = 0
+        if self._segments and not self._segments[-1]['archived']:
+            try:
+                self._active_size = os.path.getsize(
+                    self._path(self._segments[-1]))
+            except OSError:
+                pass
+
+    def _path(self, segment):
+        name = segment['file'] + ('.gz' if segment['archived'] else '')
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        """Read the segment index, rebuilding it from the directory if needed"""
+        index_path = os.path.join(self.directory, self.INDEX_NAME)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['segments']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Rebuilding usage segment index: {e}")
+
+        segments = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        for name in names:
+            match = SEGMENT_RE.match(name)
+            if match:
+                day, part, archived = match.groups()
+                file_name = name[:-3] if archived else name
+                segments[file_name] = {'file': file_name, 'day': day,
+                                       'part': int(part or 0),
+                                       'archived': bool(archived)}
+        return sorted(segments.values(),
+                      key=lambda segment: (segment['day'], segment['part']))
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(os.path.join(self.directory, self.INDEX_NAME),
+                     json.dumps({'segments': self._segments}, indent=1))
+
+    def append(self, entry):
+        """Append one usage entry"""
+        self.write([entry])
+
+    def write(self, entries, fsync=False):
+        """Append entries to today's segment, rotating as needed"""
+        if not entries:
+            return
+        data = ''.join(json.dumps(entry) + '\n' for entry in entries)
+        data = data.encode('utf-8')
+        with self._lock:
+            self._rotate_if_needed(date.today().isoformat())
+            with open(self._path(self._segments[-1]), 'ab') as f:
+                f.write(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._active_size += len(data)
+
+    def _rotate_if_needed(self, day):
+        active = self._segments[-1] if self._segments else None
+        if active is not None and not active['archived'] and \
+                active['day'] == day and \
+                not (self.max_bytes and self._active_size >= self.max_bytes):
+            return
+
+        part = active['part'] + 1 if active and active['day'] == day else 0
+        suffix = f".{part}" if part else ''
+        self._segments.append({'file': f"usage-{day}{suffix}.jsonl",
+                               'day': day, 'part': part, 'archived': False})
+        self._active_size = 0
+        self._save_index()
+
+        if active is not None and self.on_rotate is not None:
+            threading.Thread(target=self.on_rotate, daemon=True,
+                             name='cognitrix-usage-rotate').start()
+
+    def segments(self, since=None):
+        """Return segment paths, oldest first, that may hold entries on or
+        after the since date (YYYY-MM-DD). The legacy log is always included.
+        """
+        with self._lock:
+            paths = [self._path(segment) for segment in self._segments
+                     if since is None or segment['day'] >= since]
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            paths.insert(0, self.legacy_path)
+        return paths
+
+    def entries(self, since=None):
+        """Yield logged entries from the segments covering since onwards"""
+        for path in self.segments(since):
+            opener = gzip.open if path.endswith('.gz') else open
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if since is None or \
+                                (_entry_date(entry.get('timestamp')) or '') >= since:
+                            yield entry
+            except FileNotFoundError:
+                continue  # Archived while we were reading
+
+    def archive(self):
+        """Gzip closed segments older than archive_after_days.
+
+        Returns the number of segments archived.
+        """
+        cutoff = (date.today() -
+                  timedelta(days=self.archive_after_days)).isoformat()
+        with self._lock:
+            candidates = [segment for segment in self._segments[:-1]
+                          if not segment['archived'] and segment['day'] < cutoff]
+
+        archived = 0
+        for segment in candidates:
+            source = self._path(segment)
+            try:
+                with open(source, 'rb') as src, \
+                        gzip.open(source + '.gz.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(source + '.gz.tmp', source + '.gz')
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error archiving usage segment {source}: {e}")
+                continue
+
+            with self._lock:
+                segment['archived'] = True
+                self._save_index()
+            try:
+                os.remove(source)
+            except FileNotFoundError:
+                pass
+            archived += 1
+        return archived
+
+
+def _entry_date(timestamp):
+    """Return the YYYY-MM-DD part of an ISO timestamp, or None"""
+    if isinstance(timestamp, str) and len(timestamp) >= 10 and \
+            timestamp[4] == '-' and timestamp[7] == '-':
+        return timestamp[:10]
+    return None
+
+
+class UsageRollups:
+    """Usage log statistics updated from the last processed byte offset.
+
+    Per-day copy counts, per-day per-prompt copy counts and a small ring of
+    the most recent actions are persisted to a JSON file together with the
+    offset reached in each log file, so a refresh only reads the lines
+    appended since the previous one.
+    """
+
+    VERSION = 1
+
+    def __init__(self, rollup_path):
+        self.rollup_path = rollup_path
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.offsets = {}        # log path -> bytes processed
+        self.total_copies = 0
+        self.daily_copies = {}   # date -> copies
+        self.prompt_daily = {}   # date -> {prompt_id: copies}
+        self.recent = []         # newest RECENT_ACTIVITY_SIZE entries
+
+    def _load(self):
+        try:
+            with open(self.rollup_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable usage rollups: {e}")
+            return
+
+        if state.get('version') != self.VERSION:
+            return
+        self.offsets = state.get('offsets', {})
+        self.total_copies = state.get('total_copies', 0)
+        self.daily_copies = state.get('daily_copies', {})
+        self.prompt_daily = state.get('prompt_daily', {})
+        self.recent = state.get('recent', [])
+
+    def save(self):
+        """Persist the rollups and log offsets"""
+        state = {
+            'version': self.VERSION,
+            'offsets': self.offsets,
+            'total_copies': self.total_copies,
+            'daily_copies': self.daily_copies,
+            'prompt_daily': self.prompt_daily,
+            'recent': self.recent
+        }
+        os.makedirs(os.path.dirname(self.rollup_path) or '.', exist_ok=True)
+        atomic_write(self.rollup_path, json.dumps(state))
+
+    def refresh(self, log_paths):
+        """Fold newly appended log lines into the rollups.
+
+        Returns the number of entries processed.
+        """
+        with self._lock:
+            log_paths = [str(path) for path in log_paths]
+            sizes = {}
+            for path in log_paths:
+                if path.endswith('.gz'):
+                    continue
+                try:
+                    sizes[path] = os.path.getsize(path)
+                except OSError:
+                    pass  # Being archived; picked up as .gz next time
+
+            # A log that shrank was rewritten; the rollups can no longer be
+            # adjusted incrementally, so rebuild them
+            if any(size < self.offsets.get(path, 0)
+                   for path, size in sizes.items()):
+                self._reset()
+
+            processed = 0
+            new_entries = []
+            keys = set()
+            for path in log_paths:
+                if path.endswith('.gz'):
+                    # Archives are immutable copies of segments that were
+                    # read in full before being compressed
+                    key = path[:-3]
+                    keys.add(key)
+                    if key not in self.offsets:
+                        count, _ = self._read_from(path, 0, new_entries)
+                        processed += count
+                        self.offsets[key] = -1
+                    continue
+
+                keys.add(path)
+                offset = self.offsets.get(path, 0)
+                if sizes.get(path, 0) <= offset:
+                    continue
+                count, offset = self._read_from(path, offset, new_entries)
+                processed += count
+                self.offsets[path] = offset
+
+            # Forget segments that no longer exist
+            stale = [path for path in self.offsets if path not in keys]
+            for path in stale:
+                del self.offsets[path]
+
+            if new_entries:
+                self.recent = heapq.nlargest(
+                    RECENT_ACTIVITY_SIZE, self.recent + new_entries,
+                    key=lambda entry: entry.get('timestamp', ''))
+            if processed or stale:
+                self._prune()
+                self.save()
+            return processed
+
+    def _read_from(self, path, offset, new_entries):
+        """Process complete lines of path after offset"""
+        count = 0
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written line; pick it up next time
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._add(entry)
+                new_entries.append(entry)
+                count += 1
+        return count, offset
+
+    def _add(self, entry):
+        if entry.get('action') != 'copy':
+            return
+        self.total_copies += 1
+        day = _entry_date(entry.get('timestamp'))
+        if day is None:
+            return
+        self.daily_copies[day] = self.daily_copies.get(day, 0) + 1
+        prompts = self.prompt_daily.setdefault(day, {})
+        prompt_id = entry.get('prompt_id')
+        prompts[prompt_id] = prompts.get(prompt_id, 0) + 1
+
+    def _prune(self):
+        """Drop per-prompt counts that fell out of the top prompts window"""
+        cutoff = (date.today() -
+                  timedelta(days=TOP_PROMPTS_WINDOW_DAYS)).isoformat()
+        for day in [day for day in self.prompt_daily if day < cutoff]:
+            del self.prompt_daily[day]
+
+    def stats(self, today=None):
+        """Return the dashboard statistics"""
+        today = today or date.today()
+        cutoff = (today - timedelta(days=TOP_PROMPTS_WINDOW_DAYS)).isoformat()
+        with self._lock:
+            most_used = Counter()
+            for day, prompts in self.prompt_daily.items():
+                if day >= cutoff:
+                    most_used.update(prompts)
+            return {
+                'total_copies': self.total_copies,
+                'today_copies': self.daily_copies.get(today.isoformat(), 0),
+                'most_used_prompts': [
+                    {'prompt_id': pid, 'count': count}
+                    for pid, count in most_used.most_common(5)
+                ],
+                'recent_activity': list(self.recent)
+            }
+
+
+class SQLiteUsageStore:
+    """Usage events in a local SQLite database.
+
+    A drop-in target for AsyncUsageWriter: each write() is one transaction.
+    The dashboard statistics are indexed aggregate queries, so they stay
+    fast however many events accumulate.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS usage_events (
+            id INTEGER PRIMARY KEY,
+            prompt_id TEXT,
+            action TEXT,
+            timestamp TEXT,
+            entry TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_usage_prompt_time
+            ON usage_events (prompt_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_usage_action_time
+            ON usage_events (action, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_usage_time
+            ON usage_events (timestamp);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._synchronous = 'NORMAL'
+        self._conn.executescript(self.SCHEMA)
+
+    def write(self, entries, fsync=False):
+        """Insert entries in a single transaction"""
+        if not entries:
+            return
+        rows = [(entry.get('prompt_id'), entry.get('action'),
+                 entry.get('timestamp'), json.dumps(entry))
+                for entry in entries]
+        with self._lock:
+            synchronous = 'FULL' if fsync else 'NORMAL'
+            if synchronous != self._synchronous:
+                self._conn.execute(f'PRAGMA synchronous={synchronous}')
+                self._synchronous = synchronous
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO usage_events (prompt_id, action, timestamp, entry) '
+                    'VALUES (?, ?, ?, ?)', rows)
+
+    def count(self):
+        """Return the number of stored events"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM usage_events').fetchone()[0]
+
+    def stats(self, today=None):
+        """Return the dashboard statistics"""
+        today = today or date.today()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        cutoff = (today - timedelta(days=TOP_PROMPTS_WINDOW_DAYS)).isoformat()
+        with self._lock:
+            total_copies = self._conn.execute(
+                "SELECT COUNT(*) FROM usage_events WHERE action = 'copy'"
+            ).fetchone()[0]
+            today_copies = self._conn.execute(
+                "SELECT COUNT(*) FROM usage_events WHERE action = 'copy' "
+                "AND timestamp >= ? AND timestamp < ?",
+                (today.isoformat(), tomorrow)).fetchone()[0]
+            most_used = self._conn.execute(
+                "SELECT prompt_id, COUNT(*) AS uses FROM usage_events "
+                "WHERE action = 'copy' AND timestamp >= ? "
+                "GROUP BY prompt_id ORDER BY uses DESC LIMIT 5",
+                (cutoff,)).fetchall()
+            recent = self._conn.execute(
+                'SELECT entry FROM usage_events '
+                'ORDER BY timestamp DESC LIMIT ?',
+                (RECENT_ACTIVITY_SIZE,)).fetchall()
+
+        return {
+            'total_copies': total_copies,
+            'today_copies': today_copies,
+            'most_used_prompts': [{'prompt_id': pid, 'count': count}
+                                  for pid, count in most_used],
+            'recent_activity': [json.loads(entry) for entry, in recent]
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
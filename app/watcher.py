@@ -0,0 +1,201 @@
+"""
+Cognitrix prompt watcher
+Background thread that applies changes under the prompts directory to the
+in-memory index. Uses inotify on Linux and falls back to stat polling.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+
+class Inotify:
+    """Minimal ctypes wrapper around the Linux inotify API"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                  IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+                  IN_MOVE_SELF)
+
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError('inotify is not available on this platform')
+
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches = {}  # watch descriptor -> directory path
+
+    def add_watch(self, path):
+        """Watch a single directory"""
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.watches[wd] = str(path)
+        return wd
+
+    def add_tree(self, root):
+        """Watch a directory and every directory below it"""
+        for dirpath, dirnames, filenames in os.walk(root):
+            try:
+                self.add_watch(dirpath)
+            except OSError as e:
+                print(f"Watcher could not watch {dirpath}: {e}")
+
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return [(mask, path)]"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        header_size = self.EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(
+                data, offset)
+            offset += header_size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if mask & self.IN_Q_OVERFLOW or directory is None:
+                events.append((mask, None))
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name)) if name \
+                else directory
+            events.append((mask, path))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PromptWatcher(threading.Thread):
+    """Apply prompt file changes to a PromptManager in small batches"""
+
+    def __init__(self, manager, interval=2.0, batch_size=50, debounce=0.5,
+                 use_inotify=True):
+        super().__init__(name='cognitrix-prompt-watcher', daemon=True)
+        self.manager = manager
+        self.interval = max(float(interval), 0.1)
+        self.batch_size = max(int(batch_size), 1)
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self.mode = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the watcher to exit after its current wait"""
+        self._stop_event.set()
+
+    def run(self):
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, polling prompts instead: {e}")
+
+        try:
+            if inotify:
+                self.mode = 'inotify'
+                self._run_inotify(inotify)
+            else:
+                self.mode = 'polling'
+                self._run_polling()
+        except Exception as e:
+            print(f"Prompt watcher stopped: {e}")
+        finally:
+            if inotify:
+                inotify.close()
+
+    def _apply(self, paths, current=None):
+        """Apply changed paths to the index batch_size files at a time"""
+        paths = sorted(paths)
+        for start in range(0, len(paths), self.batch_size):
+            batch = paths[start:start + self.batch_size]
+            try:
+                changes = self.manager.apply_changes(batch, current)
+            except Exception as e:
+                print(f"Error applying prompt changes: {e}")
+                continue
+            if any(changes.values()):
+                print(f"Prompt index updated: {changes}")
+
+    def _rescan(self):
+        """Diff the whole tree against the manifest and apply the result"""
+        current = self.manager.scan_manifest()
+        paths = self.manager.changed_paths(current)
+        if paths:
+            self._apply(paths, current)
+
+    def _run_polling(self):
+        while not self._stop_event.wait(self.interval):
+            self._rescan()
+
+    def _run_inotify(self, inotify):
+        inotify.add_tree(self.manager.prompts_dir)
+        # Catch anything that changed between the initial load and now
+        self._rescan()
+
+        pending = set()
+        rescan = False
+        last_event = 0.0
+        while not self._stop_event.is_set():
+            events = inotify.read_events(
+                self.debounce if pending or rescan else self.interval)
+
+            for mask, path in events:
+                last_event = time.monotonic()
+                if path is None:
+                    rescan = True
+                elif mask & Inotify.IN_ISDIR:
+                    if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                        inotify.add_tree(path)
+                    # Directory moves and deletes can touch many files
+                    rescan = True
+                elif path.endswith('.md'):
+                    pending.add(path)
+
+            quiet = time.monotonic() - last_event >= self.debounce
+            if rescan and quiet:
+                rescan = False
+                pending.clear()
+                self._rescan()
+            elif pending and (quiet or len(pending) >= self.batch_size):
+                batch, pending = pending, set()
+                self._apply(batch)
@@ -9,8 +9,9 @@ import os
 import re
 import json
 import yaml
-import requests
 from pathlib import Path
+from frontmatter_parser import load_frontmatter
+from ollama_client import PRIORITY_BATCH, get_client
 from datetime import datetime
 from collections import Counter
 import logging
@@ -48,6 +49,7 @@ class PromptCategorizer:
             'model', self.ollama_config.get('default_model', 'llama3.2:1b'))
         self.timeout = self.ollama_config.get('timeout', 30)
         self.connect_timeout = self.ollama_config.get('connect_timeout', 10)
+        self.ollama = self._create_client()
 
         # Load categorization cache
         self.cache = self._load_cache()
@@ -56,6 +58,15 @@ class PromptCategorizer:
         self.category_keywords = self.categorization_config.get(
             'categories', self._get_default_categories())
 
+    def _create_client(self):
+        """Get the shared pooled Ollama client for the configured server"""
+        return get_client(self.ollama_config.get('host', 'localhost'),
+                          self.ollama_config.get('port', 11434),
+                          self.timeout, self.connect_timeout,
+                          self.ollama_config.get('max_concurrent'),
+                          self.ollama_config.get('max_queue'),
+                          self.ollama_config.get('queue_timeout'))
+
     def _get_default_categories(self):
         """Default category keywords if not specified in config"""
         return {
@@ -304,17 +315,12 @@ Prompt to categorize:
 Respond with only the category name from the list above."""
 
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": categorization_prompt,
-                    "stream": False,
-                    "options": self.ollama_config.get('model_options', {})
-                },
-                timeout=self.timeout,
-                headers={'Connection': 'close'}
-            )
+            response = self.ollama.generate({
+                "model": self.model,
+                "prompt": categorization_prompt,
+                "stream": False,
+                "options": self.ollama_config.get('model_options', {})
+            }, priority=PRIORITY_BATCH)
 
             if response.status_code == 200:
                 result = response.json()
@@ -454,7 +460,7 @@ Respond with only the category name from the list above."""
                     prompt_content = parts[2].strip()
 
                     try:
-                        existing_metadata = yaml.safe_load(frontmatter) or {}
+                        existing_metadata = load_frontmatter(frontmatter) or {}
                     except:
                         existing_metadata = {}
                 else:
@@ -592,6 +598,18 @@ Respond with only the category name from the list above."""
         print("\nCategory distribution:")
         for category, count in sorted(results['categories'].items(), key=lambda x: x[1], reverse=True):
             print(f"  {category}: {count}")
+
+        metrics = self.ollama.metrics()
+        if metrics['requests']:
+            print(f"\nOllama requests: {metrics['requests']} "
+                  f"({metrics['connections_opened']} connections opened, "
+                  f"{metrics['connections_reused']} reused, "
+                  f"avg {metrics['avg_request_ms']} ms)")
+            queue = metrics['scheduler']
+            print(f"Ollama queue: avg wait {queue['avg_wait_ms']} ms, "
+                  f"max wait {queue['max_wait_ms']} ms, "
+                  f"{queue['rejected'] + queue['timed_out']} rejected, "
+                  f"{metrics['coalesced']} duplicates coalesced")
         print("="*60)
 
     def analyze_categories(self):
@@ -611,7 +629,7 @@ Respond with only the category name from the list above."""
                 if content.startswith('---'):
                     parts = content.split('---', 2)
                     if len(parts) >= 3:
-                        metadata = yaml.safe_load(parts[1]) or {}
+                        metadata = load_frontmatter(parts[1]) or {}
                         category = metadata.get('category', 'uncategorized')
                         categories[category] += 1
                     else:
@@ -659,6 +677,8 @@ def main():
     if args.port:
         categorizer.ollama_config['port'] = args.port
         categorizer.ollama_url = f"http://{categorizer.ollama_config['host']}:{args.port}"
+    if args.host or args.port:
+        categorizer.ollama = categorizer._create_client()
 
     if args.dry_run:
         print("[SCAN] DRY RUN MODE - No changes will be made")
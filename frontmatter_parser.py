@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Cognitrix Frontmatter Parser
+Shared YAML frontmatter loading and writing for the web app and the
+categorizer.
+
+Frontmatter written by Cognitrix itself is a flat mapping of scalars and
+block lists, so it is parsed by a small line-based fast path. Anything
+outside that subset falls back to full YAML, using libyaml's CSafeLoader
+when PyYAML was built with it.
+"""
+
+import os
+import re
+import stat
+import tempfile
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+KEY_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_-]*$')
+INT_RE = re.compile(r'[-+]?(?:0|[1-9][0-9]*)$')
+FLOAT_RE = re.compile(r'[-+]?[0-9]+\.[0-9]+$')
+
+# Plain scalars YAML 1.1 resolves to something other than a string
+NULL_VALUES = {'', '~', 'null', 'Null', 'NULL'}
+TRUE_VALUES = {'yes', 'Yes', 'YES', 'true', 'True', 'TRUE',
+               'on', 'On', 'ON'}
+FALSE_VALUES = {'no', 'No', 'NO', 'false', 'False', 'FALSE',
+                'off', 'Off', 'OFF'}
+
+# Characters that give a plain scalar special meaning when leading it
+INDICATORS = set('[]{}>|*&!%@`#,?:-<=."\'')
+
+
+class UnsupportedFrontmatter(Exception):
+    """Raised by the fast path for YAML outside the flat subset"""
+
+
+def _parse_scalar(value):
+    """Parse a single flat-YAML scalar the way SafeLoader would"""
+    if value in NULL_VALUES:
+        return None
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+
+    first = value[0]
+    if first == "'":
+        if len(value) < 2 or value[-1] != "'":
+            raise UnsupportedFrontmatter(value)
+        inner = value[1:-1]
+        if "'" in inner.replace("''", ''):
+            raise UnsupportedFrontmatter(value)
+        return inner.replace("''", "'")
+
+    if first == '"':
+        inner = value[1:-1]
+        if len(value) < 2 or value[-1] != '"' or '"' in inner or \
+                '\\' in inner:
+            raise UnsupportedFrontmatter(value)
+        return inner
+
+    if INT_RE.match(value):
+        return int(value)
+    if FLOAT_RE.match(value):
+        return float(value)
+
+    # Digits may mean dates, octal, sexagesimal and so on; leave those
+    # and anything with comment or mapping syntax to the real parser
+    if first.isdigit() or first in INDICATORS or first == '+' or \
+            ': ' in value or ' #' in value or value.endswith(':'):
+        raise UnsupportedFrontmatter(value)
+    return value
+
+
+def parse_flat_frontmatter(text):
+    """Parse flat `key: scalar` / `key:` + `- item` frontmatter.
+
+    Raises UnsupportedFrontmatter for anything outside that subset.
+    """
+    if '\t' in text or '\r' in text:
+        raise UnsupportedFrontmatter('tabs or carriage returns')
+
+    metadata = {}
+    list_key = None
+    seen_content = False
+    for line in text.split('\n'):
+        stripped = line.rstrip(' ')
+        if not stripped:
+            continue
+        seen_content = True
+
+        if stripped.startswith('- ') or stripped == '-':
+            if list_key is None or stripped == '-':
+                raise UnsupportedFrontmatter(line)
+            metadata[list_key].append(_parse_scalar(stripped[2:].strip()))
+            continue
+
+        if line[0] == ' ':
+            raise UnsupportedFrontmatter(line)
+
+        if stripped.endswith(':'):
+            key, value = stripped[:-1], ''
+        elif ': ' in stripped:
+            key, value = stripped.split(': ', 1)
+            value = value.strip()
+        else:
+            raise UnsupportedFrontmatter(line)
+
+        if not KEY_RE.match(key) or key in TRUE_VALUES or \
+                key in FALSE_VALUES or key in NULL_VALUES:
+            raise UnsupportedFrontmatter(line)
+
+        if value:
+            metadata[key] = _parse_scalar(value)
+            list_key = None
+        else:
+            # Either a block list follows or the value is null
+            metadata[key] = []
+            list_key = key
+
+    if not seen_content:
+        return None
+
+    # Keys followed by no list items are nulls, as in YAML
+    for key, value in metadata.items():
+        if value == [] and isinstance(value, list):
+            metadata[key] = None
+    return metadata
+
+
+def load_yaml(text):
+    """Load YAML with the fastest available safe loader"""
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def load_frontmatter(text):
+    """Load frontmatter YAML, trying the flat fast path first.
+
+    Raises yaml.YAMLError for malformed YAML, like yaml.safe_load.
+    """
+    try:
+        return parse_flat_frontmatter(text)
+    except UnsupportedFrontmatter:
+        return load_yaml(text)
+
+
+def dump_frontmatter(metadata, body):
+    """Render metadata and prompt body back into a markdown file"""
+    frontmatter = yaml.dump(metadata, default_flow_style=False, sort_keys=False)
+    return f"---\n{frontmatter}---\n{body}"
+
+
+def atomic_write(path, data):
+    """Write text or bytes to path via a temp file and rename.
+
+    Readers never observe a half-written file, and an existing file's
+    permissions are carried over to the replacement.
+    """
+    path = os.fspath(path)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_prompt_file(path, metadata, body):
+    """Atomically rewrite a prompt file with new frontmatter"""
+    atomic_write(path, dump_frontmatter(metadata, body))
@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+"""
+Cognitrix Ollama Client
+Shared HTTP client for the web app and the categorizer. Requests go through
+one pooled keep-alive session per Ollama server, so repeated calls reuse
+TCP connections instead of opening a new one each time. Generations are
+admitted through a per-server scheduler, shared by every process on the
+machine, that bounds concurrency and serves interactive requests before
+batch work, and identical generations already in flight are shared rather
+than sent twice. Also provides a response cache for
+repeated generations.
+"""
+
+import os
+import json
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from frontmatter_parser import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to per-process scheduling
+    fcntl = None
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_CONCURRENT = 2
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_QUEUE_TIMEOUT = 60
+
+# The web app and the categorizer CLI both resolve this to <root>/cache,
+# so they queue for the same Ollama slots
+DEFAULT_SCHEDULER_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'ollama_scheduler')
+SCHEDULER_POLL_INTERVAL = 0.02
+SHARED_RESULT_TTL = 600  # seconds before shared flight files are pruned
+
+# Scheduler priority classes; lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def generation_key(model, prompt, options=None):
+    """Hash a model, rendered prompt and options into a request key"""
+    raw = json.dumps([model, prompt, options or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class OllamaBusyError(Exception):
+    """Raised when the scheduler queue is full or a request waited too long"""
+
+
+class RequestScheduler:
+    """Bounded priority queue in front of an Ollama server.
+
+    At most max_concurrent requests run at once. Others wait in priority
+    order (FIFO within a class); once max_queue requests are waiting, new
+    ones are rejected with OllamaBusyError instead of piling up.
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 max_queue=DEFAULT_MAX_QUEUE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = 0
+        self._active = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._peak_queue = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def configure(self, max_concurrent=None, max_queue=None,
+                  queue_timeout=None):
+        """Update limits; waiting requests are re-checked immediately"""
+        with self._cond:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, max_concurrent)
+            if max_queue is not None:
+                self.max_queue = max(0, max_queue)
+            if queue_timeout is not None:
+                self.queue_timeout = queue_timeout
+            self._cond.notify_all()
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Wait for a slot; every successful acquire needs one release()
+        with the value it returned"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with self._cond:
+            if not self._waiting and self._active < self.max_concurrent:
+                self._active += 1
+                self._admitted += 1
+                return
+
+            if len(self._waiting) >= self.max_queue:
+                self._rejected += 1
+                raise OllamaBusyError(
+                    f"Ollama queue is full ({len(self._waiting)} waiting)")
+
+            ticket = (priority, self._seq)
+            self._seq += 1
+            heapq.heappush(self._waiting, ticket)
+            self._peak_queue = max(self._peak_queue, len(self._waiting))
+
+            deadline = start + timeout if timeout else None
+            while not (self._waiting[0] == ticket and
+                       self._active < self.max_concurrent):
+                remaining = deadline - time.perf_counter() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._timed_out += 1
+                    self._cond.notify_all()
+                    raise OllamaBusyError(
+                        f"Timed out after {timeout} s waiting for Ollama")
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self._admitted += 1
+            waited = time.perf_counter() - start
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            # The next waiter may also fit if the limit was raised
+            self._cond.notify_all()
+
+    def release(self, slot=None):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Hold a slot for the duration of a with block"""
+        slot = self.acquire(priority, timeout)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def metrics(self):
+        """Return queue depth, concurrency and wait time figures"""
+        with self._cond:
+            return {
+                'shared': False,
+                'active': self._active,
+                'queued': len(self._waiting),
+                'queued_interactive': sum(
+                    1 for priority, _ in self._waiting
+                    if priority == PRIORITY_INTERACTIVE),
+                'peak_queued': self._peak_queue,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'avg_wait_ms': round(
+                    self._total_wait * 1000 / self._admitted, 1) if self._admitted else 0,
+                'max_wait_ms': round(self._max_wait * 1000, 1)
+            }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Exists but belongs to another user
+    return True
+
+
+class SharedRequestScheduler(RequestScheduler):
+    """RequestScheduler whose slots and queue are shared between processes.
+
+    Each slot is a lock file held with flock while a request runs, and
+    waiting requests are listed in queue.json, guarded by queue.lock. The
+    head of the queue (by priority, then arrival) takes the next free
+    slot, whichever process it belongs to. The OS releases the flocks of a
+    process that dies, and its queue entries are dropped on the next read.
+    Counters in metrics() are per process; queue depth is machine-wide.
+    """
+
+    def __init__(self, directory, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 max_queue=DEFAULT_MAX_QUEUE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        super().__init__(max_concurrent, max_queue, queue_timeout)
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue_path = os.path.join(self.directory, 'queue.json')
+
+    @contextmanager
+    def _queue_lock(self):
+        with open(os.path.join(self.directory, 'queue.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_queue(self):
+        """Return the live waiting tickets, oldest and most urgent first"""
+        try:
+            with open(self._queue_path, 'r', encoding='utf-8') as f:
+                tickets = json.load(f)
+        except (OSError, ValueError):
+            return []
+        tickets = [ticket for ticket in tickets if _pid_alive(ticket[2])]
+        tickets.sort(key=lambda ticket: (ticket[0], ticket[1], ticket[3]))
+        return tickets
+
+    def _write_queue(self, tickets):
+        atomic_write(self._queue_path, json.dumps(tickets))
+
+    def _try_slot(self):
+        """Lock a free slot file and return it, or None if all are busy"""
+        for index in range(self.max_concurrent):
+            f = open(os.path.join(self.directory, f'slot-{index}.lock'), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except OSError:
+                f.close()
+        return None
+
+    def _admit(self, slot, start):
+        waited = time.perf_counter() - start
+        with self._cond:
+            self._active += 1
+            self._admitted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return slot
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Wait for a slot; every successful acquire needs one release()
+        with the value it returned"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with self._cond:
+            self._seq += 1
+            ticket_id = f"{os.getpid()}-{threading.get_ident()}-{self._seq}"
+
+        with self._queue_lock():
+            tickets = self._read_queue()
+            if not tickets:
+                slot = self._try_slot()
+                if slot is not None:
+                    return self._admit(slot, start)
+            if len(tickets) >= self.max_queue:
+                with self._cond:
+                    self._rejected += 1
+                raise OllamaBusyError(
+                    f"Ollama queue is full ({len(tickets)} waiting)")
+            tickets.append([priority, time.time(), os.getpid(), ticket_id])
+            self._write_queue(tickets)
+            with self._cond:
+                self._peak_queue = max(self._peak_queue, len(tickets))
+
+        try:
+            while True:
+                time.sleep(SCHEDULER_POLL_INTERVAL)
+                with self._queue_lock():
+                    tickets = self._read_queue()
+                    if tickets and tickets[0][3] == ticket_id:
+                        slot = self._try_slot()
+                        if slot is not None:
+                            self._write_queue(tickets[1:])
+                            return self._admit(slot, start)
+                if timeout and time.perf_counter() - start > timeout:
+                    with self._cond:
+                        self._timed_out += 1
+                    raise OllamaBusyError(
+                        f"Timed out after {timeout} s waiting for Ollama")
+        except BaseException:
+            with self._queue_lock():
+                self._write_queue([ticket for ticket in self._read_queue()
+                                   if ticket[3] != ticket_id])
+            raise
+
+    def release(self, slot=None):
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        slot.close()
+        with self._cond:
+            self._active -= 1
+
+    def metrics(self):
+        """Return queue depth, concurrency and wait time figures"""
+        tickets = self._read_queue()
+        metrics = super().metrics()
+        metrics.update({
+            'shared': True,
+            'queued': len(tickets),
+            'queued_interactive': sum(
+                1 for ticket in tickets if ticket[0] == PRIORITY_INTERACTIVE)
+        })
+        return metrics
+
+
+class OllamaClient:
+    """Ollama API client backed by a pooled requests.Session"""
+
+    def __init__(self, base_url, timeout=30, connect_timeout=10,
+                 pool_size=DEFAULT_POOL_SIZE, scheduler=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.scheduler = scheduler or RequestScheduler()
+        self._in_flight = {}  # generation key -> _Flight
+
+        # Generations in flight are also visible to other processes when
+        # the scheduler is shared
+        scheduler_dir = getattr(self.scheduler, 'directory', None)
+        self.flight_dir = os.path.join(scheduler_dir, 'in_flight') \
+            if scheduler_dir else None
+        self._shared_flights = 0
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._total_time = 0.0
+        self._coalesced = 0
+
+    def _timeout(self, timeout):
+        """Return a (connect, read) timeout tuple for requests"""
+        return (self.connect_timeout, timeout or self.timeout)
+
+    def post(self, path, payload, timeout=None, stream=False):
+        """POST JSON to an Ollama API path and return the response"""
+        start = time.perf_counter()
+        try:
+            return self.session.post(f"{self.base_url}{path}", json=payload,
+                                     timeout=self._timeout(timeout),
+                                     stream=stream)
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._requests += 1
+                self._total_time += time.perf_counter() - start
+
+    def get(self, path, timeout=None):
+        """GET an Ollama API path and return the response"""
+        start = time.perf_counter()
+        try:
+            return self.session.get(f"{self.base_url}{path}",
+                                    timeout=self._timeout(timeout))
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._requests += 1
+                self._total_time += time.perf_counter() - start
+
+    def generate(self, payload, timeout=None, stream=False,
+                 priority=PRIORITY_INTERACTIVE):
+        """Call /api/generate through the scheduler.
+
+        Identical non-streamed generations that are already in flight are
+        coalesced: later callers in this process wait for the first one and
+        receive the same response (or exception), and callers in other
+        processes sharing the scheduler receive the same response. A
+        streamed response is read after this
+        returns, so streaming callers must hold scheduler.acquire()
+        themselves until the body has been consumed; stream=True skips both
+        the scheduler and coalescing.
+        """
+        if stream:
+            return self.post('/api/generate', payload, timeout=timeout,
+                             stream=True)
+
+        key = generation_key(payload.get('model'), payload.get('prompt'),
+                             payload.get('options'))
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            if self.flight_dir:
+                flight.response = self._generate_shared(
+                    key, payload, timeout, priority)
+            else:
+                with self.scheduler.slot(priority):
+                    flight.response = self.post('/api/generate', payload,
+                                                timeout=timeout)
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def _generate_shared(self, key, payload, timeout, priority):
+        """Run a generation unless another process is already running it.
+
+        The process running a generation holds an flock on <key>.lock and
+        stores the response in <key>.json before unlocking; processes that
+        find the lock taken wait for it and reuse that response. If the
+        other process failed, the waiter runs the generation itself.
+        """
+        os.makedirs(self.flight_dir, exist_ok=True)
+        lock_path = os.path.join(self.flight_dir, f"{key}.lock")
+        result_path = os.path.join(self.flight_dir, f"{key}.json")
+        started = time.time()
+
+        with open(lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                response = self._read_shared_result(result_path, started)
+                if response is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                    with self._lock:
+                        self._coalesced += 1
+                    return response
+
+            try:
+                with self.scheduler.slot(priority):
+                    response = self.post('/api/generate', payload,
+                                         timeout=timeout)
+                self._write_shared_result(result_path, response)
+                return response
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_shared_result(self, path, since):
+        """Return a response another process finished after since, or None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('finished_at', 0) < since:
+            return None
+
+        response = requests.Response()
+        response.status_code = data['status_code']
+        response._content = data['content'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = data.get('content_type', '')
+        response.url = f"{self.base_url}/api/generate"
+        return response
+
+    def _write_shared_result(self, path, response):
+        try:
+            atomic_write(path, json.dumps({
+                'finished_at': time.time(),
+                'status_code': response.status_code,
+                'content': response.text,
+                'content_type': response.headers.get('Content-Type', '')
+            }))
+        except OSError as e:
+            print(f"Error sharing Ollama response: {e}")
+            return
+
+        with self._lock:
+            self._shared_flights += 1
+            prune = self._shared_flights % 100 == 0
+        if prune:
+            self._prune_shared_results()
+
+    def _prune_shared_results(self):
+        """Delete flight files nobody has used for SHARED_RESULT_TTL"""
+        cutoff = time.time() - SHARED_RESULT_TTL
+        with os.scandir(self.flight_dir) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    continue
+
+    def metrics(self):
+        """Return request counts and how many used a pooled connection"""
+        connections = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+
+        with self._lock:
+            requests_sent = self._requests
+            return {
+                'base_url': self.base_url,
+                'requests': requests_sent,
+                'errors': self._errors,
+                'coalesced': self._coalesced,
+                'in_flight': len(self._in_flight),
+                'connections_opened': connections,
+                'connections_reused': max(pooled_requests - connections, 0),
+                'avg_request_ms': round(
+                    self._total_time * 1000 / requests_sent, 1) if requests_sent else 0,
+                'scheduler': self.scheduler.metrics()
+            }
+
+    def close(self):
+        self.session.close()
+
+
+class _Flight:
+    """A generation in progress that identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def create_scheduler(host, port, scheduler_dir=DEFAULT_SCHEDULER_DIR):
+    """Return a scheduler shared with other processes where flock exists"""
+    if fcntl is None or not scheduler_dir:
+        return RequestScheduler()
+    directory = os.path.join(scheduler_dir, f"{host}_{port}")
+    try:
+        return SharedRequestScheduler(directory)
+    except OSError as e:
+        print(f"Shared Ollama scheduler unavailable, using a local one: {e}")
+        return RequestScheduler()
+
+
+def get_client(host='localhost', port=11434, timeout=30, connect_timeout=10,
+               max_concurrent=None, max_queue=None, queue_timeout=None):
+    """Return the shared client for an Ollama server.
+
+    Clients are cached per server so every caller in the process shares one
+    connection pool; the scheduler is shared with other processes too.
+    Timeouts and scheduler limits follow the most recent configuration.
+    """
+    base_url = f"http://{host}:{port}"
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = OllamaClient(base_url, timeout, connect_timeout,
+                                  scheduler=create_scheduler(host, port))
+            _clients[base_url] = client
+        client.timeout = timeout
+        client.connect_timeout = connect_timeout
+        client.scheduler.configure(max_concurrent, max_queue, queue_timeout)
+        return client
+
+
+def all_metrics():
+    """Return metrics for every Ollama client in this process"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [client.metrics() for client in clients]
+
+
+class ResponseCache:
+    """LRU cache of generation results with a TTL and an optional disk tier.
+
+    Entries are keyed on (model, prompt, options). The newest max_entries
+    stay in memory; with a directory, every entry is also written to disk so
+    it survives restarts, and the disk tier is pruned to max_disk_entries.
+    """
+
+    def __init__(self, ttl=3600, max_entries=256, directory=None,
+                 max_disk_entries=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.directory = str(directory) if directory else None
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    make_key = staticmethod(generation_key)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, entry)
+            return entry[1]
+
+    def set(self, key, value):
+        """Cache value under key for ttl seconds"""
+        entry = (time.time() + self.ttl, value)
+        with self._lock:
+            self._remember(key, entry)
+            self._writes += 1
+            prune = self._writes % 50 == 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                atomic_write(self._path(key), json.dumps(
+                    {'expires_at': entry[0], 'value': value}))
+                if prune:
+                    self._prune_disk()
+            except OSError as e:
+                print(f"Error writing response cache: {e}")
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key, now):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('expires_at', 0) <= now:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return (data['expires_at'], data.get('value'))
+
+    def _prune_disk(self):
+        """Drop expired entries and the oldest ones beyond max_disk_entries"""
+        now = time.time()
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    files.append((entry.stat().st_mtime, entry.path))
+        files.sort()
+        excess = len(files) - self.max_disk_entries
+        for index, (mtime, path) in enumerate(files):
+            if index < excess or mtime + self.ttl <= now:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Empty both tiers"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        """Return hit and miss counts"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'ttl': self.ttl
+            }
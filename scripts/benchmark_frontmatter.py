@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+benchmark_frontmatter.py - Measure frontmatter parsing throughput
+Compares yaml.safe_load, libyaml's CSafeLoader and the shared fast path
+over real prompt files or a generated library.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+import yaml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frontmatter_parser import load_frontmatter  # noqa: E402
+
+try:
+    from yaml import CSafeLoader
+except ImportError:
+    CSafeLoader = None
+
+
+def generate_library(directory, count):
+    """Write count prompt files in the format the categorizer produces"""
+    categories = ['coding', 'writing', 'analysis', 'business', 'technical']
+    words = ['python', 'review', 'summary', 'data', 'email', 'report',
+             'design', 'plan', 'debug', 'explain', 'story', 'api']
+    random.seed(42)
+
+    for i in range(count):
+        category = random.choice(categories)
+        metadata = {
+            'title': f"Prompt {i} {' '.join(random.sample(words, 3))}",
+            'category': category,
+            'type': random.choice(['simple', 'template', 'workflow']),
+            'tags': random.sample(words, 4),
+            'variables': ['text', 'topic'],
+            'favorite': random.random() < 0.1,
+            'created': '2025-06-05',
+            'last_used': None,
+            'use_count': random.randint(0, 50),
+            'auto_categorized': '2025-06-05 19:21:53',
+            'categorization_confidence': 0.9
+        }
+        body = ' '.join(random.choices(words, k=200))
+        frontmatter = yaml.dump(metadata, default_flow_style=False,
+                                sort_keys=False)
+        category_dir = Path(directory) / category
+        category_dir.mkdir(parents=True, exist_ok=True)
+        with open(category_dir / f"prompt_{i}.md", 'w', encoding='utf-8') as f:
+            f.write(f"---\n{frontmatter}---\n\n{body}")
+
+
+def read_frontmatters(directory):
+    """Read the frontmatter text of every prompt file"""
+    texts = []
+    for prompt_file in Path(directory).rglob('*.md'):
+        with open(prompt_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if content.startswith('---'):
+            parts = content.split('---', 2)
+            if len(parts) >= 3:
+                texts.append(parts[1])
+    return texts
+
+
+def time_parser(name, parse, texts, rounds):
+    """Parse every text rounds times and report files/sec"""
+    best = None
+    errors = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in texts:
+            try:
+                parse(text)
+            except yaml.YAMLError:
+                errors += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    rate = len(texts) / best if best else 0
+    print(f"{name:28} {rate:12,.0f} files/sec  ({best * 1000:8.1f} ms)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Cognitrix frontmatter parsing")
+    parser.add_argument("--prompts-dir",
+                        help="Benchmark an existing prompts directory")
+    parser.add_argument("--generate", type=int, default=5000,
+                        help="Number of prompt files to generate (default: 5000)")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Timing rounds; the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.prompts_dir
+        if not directory:
+            directory = tmp_dir
+            generate_library(directory, args.generate)
+
+        texts = read_frontmatters(directory)
+        print(f"Benchmarking {len(texts)} frontmatter blocks from {directory}")
+        print("-" * 60)
+
+        baseline = time_parser("yaml.safe_load", yaml.safe_load,
+                               texts, args.rounds)
+        if CSafeLoader is not None:
+            time_parser("yaml.load(CSafeLoader)",
+                        lambda text: yaml.load(text, Loader=CSafeLoader),
+                        texts, args.rounds)
+        else:
+            print("yaml.load(CSafeLoader)       unavailable (PyYAML without libyaml)")
+        fast = time_parser("load_frontmatter", load_frontmatter,
+                           texts, args.rounds)
+
+        print("-" * 60)
+        if baseline:
+            print(f"Speedup over yaml.safe_load: {fast / baseline:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
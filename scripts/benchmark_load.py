@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+benchmark_load.py - Measure cold prompt loading with different worker pools
+Parses a generated (or existing) prompt library sequentially and with
+thread and process pools, the same way PromptManager's cold load does.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'app'))
+
+from benchmark_frontmatter import generate_library  # noqa: E402
+from prompt_loader import parse_prompt_files, resolve_workers  # noqa: E402
+
+
+def time_load(name, paths, workers, executor, rounds):
+    """Load every file rounds times and report the best files/sec"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        results = parse_prompt_files(paths, workers, executor)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    loaded = sum(1 for prompt_data, error in results if prompt_data)
+    rate = len(paths) / best if best else 0
+    print(f"{name:24} {rate:10,.0f} files/sec  ({best:6.2f} s, {loaded} loaded)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Cognitrix cold prompt loading")
+    parser.add_argument("--prompts-dir",
+                        help="Benchmark an existing prompts directory")
+    parser.add_argument("--generate", type=int, default=20000,
+                        help="Number of prompt files to generate (default: 20000)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Pool size (default: 0 = all CPUs)")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="Timing rounds; the best one is reported")
+    args = parser.parse_args()
+
+    workers = resolve_workers(args.workers)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.prompts_dir
+        if not directory:
+            directory = tmp_dir
+            generate_library(directory, args.generate)
+
+        paths = sorted(str(path) for path in Path(directory).rglob('*.md'))
+        print(f"Loading {len(paths)} prompt files from {directory} "
+              f"({os.cpu_count()} CPUs, {workers} workers)")
+        print("-" * 64)
+
+        sequential = time_load("sequential", paths, 1, 'thread', args.rounds)
+        threaded = time_load(f"threads x{workers}", paths, workers,
+                             'thread', args.rounds)
+        processes = time_load(f"processes x{workers}", paths, workers,
+                              'process', args.rounds)
+
+        print("-" * 64)
+        print(f"Thread speedup:  {sequential / threaded:.2f}x")
+        print(f"Process speedup: {sequential / processes:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
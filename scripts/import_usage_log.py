@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+import_usage_log.py - Load JSONL usage logs into the SQLite usage store
+Reads the legacy data/usage_log.jsonl and any daily segments (including
+gzipped archives) and inserts them in batched transactions. Run it once
+before switching performance.usage_store to "sqlite".
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'app'))
+
+from usage import SQLiteUsageStore, UsageLog  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT_DIR, 'app', 'data')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import Cognitrix usage logs into SQLite")
+    parser.add_argument("--log", default=os.path.join(DATA_DIR, 'usage_log.jsonl'),
+                        help="Legacy usage_log.jsonl file")
+    parser.add_argument("--segments", default=os.path.join(DATA_DIR, 'usage'),
+                        help="Directory of daily usage log segments")
+    parser.add_argument("--db", default=os.path.join(DATA_DIR, 'usage.db'),
+                        help="SQLite database to write")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="Events per transaction (default: 5000)")
+    parser.add_argument("--force", action="store_true",
+                        help="Import even if the database already has events")
+    args = parser.parse_args()
+
+    store = SQLiteUsageStore(args.db)
+    existing = store.count()
+    if existing and not args.force:
+        print(f"{args.db} already holds {existing} events; "
+              f"use --force to import anyway")
+        return 1
+
+    log = UsageLog(args.segments, legacy_path=args.log)
+    print(f"Importing {len(log.segments())} log files into {args.db}")
+
+    start = time.perf_counter()
+    imported = 0
+    batch = []
+    for entry in log.entries():
+        batch.append(entry)
+        if len(batch) >= args.batch_size:
+            store.write(batch)
+            imported += len(batch)
+            batch = []
+    store.write(batch)
+    imported += len(batch)
+    store.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Imported {imported} events in {elapsed:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())